@@ -1,66 +1,184 @@
+import argparse
+import atexit
+import itertools
 import time
 import os
 import traceback
 import logging
 import json
 import sys
-from dhanhq import dhanhq
+import threading
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+from concurrent.futures import ThreadPoolExecutor
 # DhanLiveFeed is not available in current dhanhq package version
 from cryptography.fernet import Fernet
 from dotenv import load_dotenv
+from core.event_store import EventStore, DEFAULT_DB_PATH, COPY_HALTED, PROFILE_REQUEST, SESSION_REPORT
+from core.async_broker import AsyncBroker, DHAN_API_URL
+from core.circuit_breaker import CircuitBreaker, is_account_failure
+from core.order_slicer import FreezeTable
+from core.instruments import InstrumentMaster, round_to_lots
+from core.event_sequencer import EventSequencer, filled_quantity
+from core.failover import LeaderLock, DEFAULT_LOCK_PATH, correlation_tag, order_tag
+from core.margin_cache import MarginCache
+from core.profiler import Profiler, DEFAULT_PROFILE_DIR, parse_profile_spec
+from core.session_guard import SessionGuard, token_expiry
+from core.common import broker_data, child_problems
 
-# Set logger
-logging.basicConfig(
-    filename='logcopytrade.log',
-    format='%(asctime)s-%(process)d-%(levelname)s-%(message)s',
-    level=logging.INFO
-)
-
-logging.info("Program Dhan Copytrader started")
+# dhanhq is imported on first use (see loadBrokerClient); it pulls in
+# heavy dependencies that --check never needs.
+dhanhq = None
 
 sourceOrders = {}
 childaccts = {}
 orderlookup = {}
 dhanmaster = None
+eventStore = None
+fernet = None
+shadowMode = False
+brokerLoop = None
+childExecutor = None
+breakers = {}
+reconcileQueue = {}
+freezeTable = FreezeTable()
+instrumentMaster = InstrumentMaster()
+sequencer = None
+copyMode = 'order'
+childFilled = {}
+childSizing = {}
+haMode = False
+adoptedOrders = {}
+marginCache = MarginCache()
+profiler = Profiler()
+tokenExpiry = {}
+sessionGuard = None
+masterconfig = {}
+copyLock = threading.RLock()
 configFile = 'config.json'
+config = {}
+
+# Zerodha to Dhan field values (the dhanhq constants), looked up once per
+# master order shape by translationPlan
+EXCHANGE_MAP = {
+    'NSE': 'NSE_EQ',
+    'BSE': 'BSE_EQ',
+    'NFO': 'NSE_FNO',
+    'BFO': 'BSE_FNO',
+    'MCX': 'MCX_COMM'
+}
+TRANSACTION_MAP = {'BUY': 'BUY', 'SELL': 'SELL'}
+PRODUCT_MAP = {
+    'MIS': 'INTRADAY',
+    'CNC': 'CNC',
+    'NRML': 'MARGIN',
+    'CO': 'CO',
+    'BO': 'BO'
+}
+ORDER_TYPE_MAP = {
+    'MARKET': 'MARKET',
+    'LIMIT': 'LIMIT',
+    'SL': 'STOP_LOSS',
+    'SL-M': 'STOP_LOSS_MARKET'
+}
+VALIDITY_MAP = {'DAY': 'DAY', 'IOC': 'IOC'}
+
+def setup_logging():
+    """Set logger"""
+    logging.basicConfig(
+        filename='logcopytrade.log',
+        format='%(asctime)s-%(process)d-%(levelname)s-%(message)s',
+        level=logging.INFO
+    )
+
+
+def load_config(path):
+    """Load configuration"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def load_encryption_key():
+    """Load encryption key and build the token decrypter"""
+    global fernet
+    load_dotenv()
+    key = os.environ.get('key')
+    if not key:
+        print('ERROR: Encryption key not found in environment variables.')
+        print('Please run "python dhan_encrypt_utility.py" first to generate encryption key and encrypt your access tokens.')
+        print('This will create a .env file with the encryption key.')
+        sys.exit(1)
+    fernet = Fernet(key.encode())
 
-# Load configuration
-with open(configFile, 'r') as f:
-    config = json.load(f)
 
-# Load encryption key
-load_dotenv()
-key = os.environ.get('key')
-if key:
-    mysecret = key.encode()
-else:
-    print('ERROR: Encryption key not found in environment variables.')
-    print('Please run "python dhan_encrypt_utility.py" first to generate encryption key and encrypt your access tokens.')
-    print('This will create a .env file with the encryption key.')
-    sys.exit(1)
+def loadBrokerClient():
+    """Import the dhanhq client on first use"""
+    global dhanhq
+    if dhanhq is None:
+        from dhanhq import dhanhq as client
+        dhanhq = client
+    return dhanhq
 
 
 def deCryptPwd(encodedPwd):
     """Decrypt encrypted passwords/tokens"""
-    f = Fernet(mysecret)
+    if fernet is None:
+        load_encryption_key()
     enc = encodedPwd.encode()
-    dec = f.decrypt(enc)
+    dec = fernet.decrypt(enc)
     return dec.decode()
 
 
+# A broker call for one child account, the master event behind it and the
+# handler for its result
+ChildCall = namedtuple('ChildCall', ['accDetail', 'method', 'kwargs', 'onDone', 'orderdata'])
+
+
+class ShadowAccount:
+    """Stand-in for a child dhanhq connection that logs orders instead of sending them"""
+
+    def __init__(self, client_id):
+        self.client_id = client_id
+        self.counter = itertools.count(1)
+
+    def _respond(self, action, **kwargs):
+        order_id = kwargs.get('order_id') or f"SHADOW-{self.client_id}-{next(self.counter)}"
+        logging.info(f"SHADOW {action} {self.client_id} - {kwargs}")
+        print(f"[shadow] {action} {self.client_id}: {kwargs}")
+        return {'status': 'success', 'remarks': 'shadow', 'data': {'orderId': order_id}}
+
+    def place_order(self, **kwargs):
+        return self._respond('place_order', **kwargs)
+
+    def modify_order(self, **kwargs):
+        return self._respond('modify_order', **kwargs)
+
+    def cancel_order(self, **kwargs):
+        return self._respond('cancel_order', **kwargs)
+
+
 def create_dhan_connection(user_config):
     """Create Dhan API connection"""
     try:
-        dhan = dhanhq(
-            client_id=user_config['client_id'],
-            access_token=deCryptPwd(user_config['access_token'])
-        )
+        access_token = deCryptPwd(user_config['access_token'])
+        tokenExpiry[user_config['client_id']] = token_expiry(access_token)
+        if brokerLoop is not None:
+            dhan = brokerLoop.client(user_config['client_id'], access_token)
+        else:
+            dhan = loadBrokerClient()(
+                client_id=user_config['client_id'],
+                access_token=access_token
+            )
+            if config.get('BROKER_URL'):
+                dhan.base_url = config['BROKER_URL']
         # Remove or replace the following line:
         # profile = dhan.get_user_profile()
         # Instead, you may want to test with a simple API call, e.g. get_fund_limits()
         test = dhan.get_fund_limits()
         if test.get('status') != 'success':
             raise Exception("Failed to fetch fund limits")
+        marginCache.update(user_config['client_id'], test['data'])
         return dhan
     except Exception as e:
         logging.error(f"Failed to connect to Dhan for {user_config['client_id']}: {e}")
@@ -68,19 +186,50 @@ def create_dhan_connection(user_config):
         sys.exit()
 
 
+def recordEvent(event, **fields):
+    """Record an order event in the history store, if enabled"""
+    if eventStore is not None:
+        eventStore.record(event, **fields)
+
+
 def on_order_update(order_data):
     """Callback for order updates"""
     logging.info(f"Order alert received: {order_data}")
-    copyTrade(order_data)
+    if sequencer is not None:
+        sequencer.submit(order_data)
+    else:
+        copyTrade(order_data)
+
+
+def onSuppressed(data, reason):
+    """Record a master update the sequencer dropped as duplicate or stale"""
+    recordEvent('master_suppressed', order_id=data.get('order_id'), status='SUPPRESSED',
+                message=reason, payload=data)
 
 
 def copyTrade(data):
     """Main copy trading logic"""
+    with copyLock:
+        profiler.call(_copyTrade, data)
+
+
+def _copyTrade(data):
     logging.debug('Starting copy trade')
+    started = time.perf_counter()
+    recordEvent('master_update', order_id=data.get('order_id'),
+                status=data.get('order_status'), payload=data)
+    
+    if copyingHalted():
+        logging.warning(f"Copying halted by kill switch, order {data.get('order_id')} not copied")
+        recordEvent('copy_halted', order_id=data.get('order_id'), status='SKIPPED',
+                    message='kill switch engaged')
+        return
     
     # Check if product type should be filtered
     if data.get('product_type') not in prodFilter:
-        if data.get('order_status') == 'CANCELLED':
+        if copyMode == 'fill':
+            copyFills(data)
+        elif data.get('order_status') == 'CANCELLED':
             cancelTargetOrders(data)
         else:
             logging.debug('Copy trade open and update')
@@ -92,142 +241,722 @@ def copyTrade(data):
                     updateTargetOrders(data)
                 else: 
                     createTargetOrders(data)
-        showMarginsAvailable()
+        logging.info(f"Processed order {data.get('order_id')} in {(time.perf_counter() - started) * 1000:.2f} ms")
+        if not shadowMode:
+            showMarginsAvailable()
     else:
         logging.info(f"Product type {data.get('product_type')} ignored")
 
 
+def copyingHalted():
+    """Tell whether the operator stopped copying from the dashboard kill switch"""
+    if eventStore is None:
+        return False
+    try:
+        return bool(eventStore.get_control(COPY_HALTED, False))
+    except Exception as e:
+        logging.error(f"Could not read copy control flag: {e}")
+        return False
+
+
 def getTargetOrder(orderid, client_id):
-    """Get target order ID from lookup"""
+    """Get target order leg IDs from lookup"""
     key = f"{orderid}|{client_id}"
     return orderlookup.get(key)
 
 
 def storeTargetOrder(parent_oid, client_id, child_oid):
-    """Store child order mapping"""
+    """Store child order mapping; a sliced order maps to several leg IDs"""
     key = f"{parent_oid}|{client_id}"
-    orderlookup[key] = child_oid
+    orderlookup.setdefault(key, []).append(child_oid)
+    persistState('save_mapping', parent_oid, client_id, child_oid)
+
+
+def dropTargetOrder(parent_oid, client_id, child_oid):
+    """Remove one leg from a child order mapping"""
+    legs = orderlookup.get(f"{parent_oid}|{client_id}", [])
+    if child_oid in legs:
+        legs.remove(child_oid)
+        persistState('drop_mapping', parent_oid, client_id, child_oid)
+
+
+def persistState(method, *args):
+    """Replicate copy state to the store so a standby can take over (--ha only)"""
+    if haMode and eventStore is not None:
+        getattr(eventStore, method)(*args)
+
+
+def timedCall(accDetail, method, kwargs):
+    """Make one blocking broker call, returning (response, latency_ms, error)"""
+    started = time.perf_counter()
+    try:
+        response = getattr(accDetail['dhanobj'], method)(**kwargs)
+        return response, (time.perf_counter() - started) * 1000, None
+    except Exception as e:
+        return None, (time.perf_counter() - started) * 1000, e
+
+
+def callChildren(calls):
+    """Run child broker calls concurrently and hand each result to its handler"""
+    global childExecutor
+    
+    # Children behind an open breaker are skipped and queued for reconciliation
+    allowed = []
+    for call in [adopted for call in calls for adopted in adoptLeg(call)]:
+        if breakers[call.accDetail['client_id']].allow():
+            allowed.append(call)
+        else:
+            queueReconcile(call)
+    calls = allowed
+    if not calls:
+        return
+    
+    if brokerLoop is not None:
+        results = brokerLoop.gather_timed(
+            [(call.accDetail['dhanobj'].aio, call.method, call.kwargs) for call in calls]
+        )
+    elif len(calls) == 1:
+        results = [profiler.call(timedCall, calls[0].accDetail, calls[0].method, calls[0].kwargs)]
+    else:
+        if childExecutor is None:
+            childExecutor = ThreadPoolExecutor(max_workers=config.get('BROKER_WORKERS', 16),
+                                               thread_name_prefix='child-call')
+        results = list(childExecutor.map(
+            lambda call: profiler.call(timedCall, call.accDetail, call.method, call.kwargs), calls
+        ))
+    
+    for call, (response, latency_ms, error) in zip(calls, results):
+        failed = is_account_failure(response, error)
+        breakers[call.accDetail['client_id']].record(latency_ms, failed, error)
+        # Only replay calls the broker definitely rejected; a create that timed
+        # out may still have reached the exchange
+        if failed and isinstance(response, dict) and isinstance(response.get('remarks'), dict):
+            queueReconcile(call)
+        call.onDone(response, latency_ms, error)
+
+
+def adoptLeg(call):
+    """Swap a place call for the leg the previous leader already placed, if any
+
+    Returns the calls to make instead of ``call``: the call itself when
+    there is nothing to adopt, otherwise whatever brings the adopted leg to
+    the current price and quantity.
+    """
+    if call.method != 'place_order' or not adoptedOrders:
+        return [call]
+    client_id = call.accDetail['client_id']
+    leg = adoptedOrders.get(client_id, {}).pop(call.kwargs.get('tag'), None)
+    if leg is None:
+        return [call]
+    orderdata = call.orderdata
+
+    if copyMode == 'fill':
+        # A copied fill is a market order that has already gone through;
+        # count what it actually was and send only what it fell short by
+        adoptOrderLeg(orderdata, client_id, leg)
+        key = f"{orderdata['order_id']}|{client_id}"
+        childFilled[key] = childFilled.get(key, 0) + leg['quantity']
+        persistState('save_fill', orderdata['order_id'], client_id, childFilled[key])
+        shortfall = call.kwargs['quantity'] - leg['quantity']
+        if shortfall <= 0:
+            return []
+        return [countedFill(place, key) for place in
+                createTargetOrder(orderdata, call.accDetail, call.kwargs, shortfall, tagPrefix=f"F{childFilled[key]}")]
+
+    def failed(e):
+        stacktrace = traceback.format_exc()
+        logging.error(f"ERROR Order update error for {orderdata['order_id']} on {client_id}: {e} - {stacktrace}")
+        recordEvent('child_update', order_id=orderdata['order_id'], client_id=client_id,
+                    status='FAILED', message=str(e))
+
+    return takeOverLeg(orderdata, call.accDetail, leg, call.kwargs, call.kwargs['quantity'], failed)
+
+
+def adoptOrderLeg(orderdata, client_id, leg):
+    """Map and record a leg the previous leader placed, with the values it actually has
+
+    ``leg`` is the child's order book entry indexed by adoptChildOrders.
+    """
+    child_oid = leg['orderId']
+    logging.warning(f"Adopting order {child_oid} on {client_id} placed before takeover")
+    recordEvent('child_adopted', order_id=orderdata['order_id'], client_id=client_id,
+                child_order_id=child_oid, status='ADOPTED')
+    storeTargetOrder(orderdata['order_id'], client_id, child_oid)
+    recordEvent('child_create', order_id=orderdata['order_id'], client_id=client_id,
+                child_order_id=child_oid, status='PLACED', message='adopted',
+                payload={'quantity': leg['quantity'], 'price': leg['price'],
+                         'trigger_price': leg['trigger_price']})
+
+
+def takeOverLeg(orderdata, accDetail, leg, place_kwargs, quantity, failed):
+    """Adopt a leg and return the modify that brings it to the current values, if needed"""
+    adoptOrderLeg(orderdata, accDetail['client_id'], leg)
+    if (leg['quantity'], leg['price'], leg['trigger_price']) == (
+            quantity, place_kwargs['price'], place_kwargs['trigger_price']):
+        return []
+    return [modifyLegCall(orderdata, accDetail, place_kwargs, leg['orderId'], quantity, failed)]
+
+
+def adoptedLegs(order_id, client_id):
+    """Pop every adopted leg of one child order, whichever fill or leg it was placed for"""
+    legs = adoptedOrders.get(client_id)
+    if not legs:
+        return []
+    prefix = order_tag(order_id, client_id)
+    return [legs.pop(tag) for tag in sorted(tag for tag in legs if tag.startswith(prefix))]
+
+
+def applyState(state):
+    """Merge replicated copy state into the in-memory tables, returning the tail cursor"""
+    sourceOrders.update(state['source_orders'])
+    for (order_id, client_id), legs in state['mappings'].items():
+        if legs:
+            orderlookup[f"{order_id}|{client_id}"] = legs
+        else:
+            orderlookup.pop(f"{order_id}|{client_id}", None)
+    for (order_id, client_id), quantity in state['fills'].items():
+        childFilled[f"{order_id}|{client_id}"] = quantity
+    for (order_id, client_id), ratio in state['sizing'].items():
+        childSizing[f"{order_id}|{client_id}"] = ratio
+    return state['cursor']
+
+
+def waitForLeadership(lock):
+    """Stay a warm standby, tailing the replicated state, until the leader lock is ours"""
+    cursor = None
+    
+    def refresh():
+        nonlocal cursor
+        cursor = applyState(eventStore.load_state(cursor))
+    
+    refresh()
+    if not lock.try_acquire():
+        print(f"Standby: leader is pid {lock.holder()}, waiting to take over")
+        logging.info(f"Running as standby for pid {lock.holder()}")
+        lock.wait(on_idle=refresh)
+    
+    started = time.perf_counter()
+    refresh()
+    adoptChildOrders()
+    logging.warning(f"Acting as leader, takeover finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+    print('Acting as leader')
+
+
+def adoptChildOrders():
+    """Index each child's live orders by correlation id so legs placed just before a crash are not placed twice"""
+    accDetails = list(childaccts.values())
+    if not accDetails:
+        return
+    with ThreadPoolExecutor(max_workers=len(accDetails), thread_name_prefix='takeover') as executor:
+        results = list(executor.map(lambda accDetail: timedCall(accDetail, 'get_order_list', {}), accDetails))
+    
+    for accDetail, (response, latency_ms, error) in zip(accDetails, results):
+        client_id = accDetail['client_id']
+        try:
+            if error is not None:
+                raise error
+            orders = broker_data(response) or []
+        except Exception as e:
+            logging.error(f"Could not read order book of {client_id} on takeover: {e}")
+            continue
+        known = {child_oid for key, legs in orderlookup.items() if key.endswith(f"|{client_id}")
+                 for child_oid in legs}
+        adoptedOrders[client_id] = {
+            order['correlationId']: {'orderId': order['orderId'], 'quantity': int(order.get('quantity') or 0),
+                                     'price': float(order.get('price') or 0),
+                                     'trigger_price': float(order.get('triggerPrice') or 0)}
+            for order in orders
+            if order.get('correlationId') and order.get('orderStatus') not in ('CANCELLED', 'REJECTED')
+            and order['orderId'] not in known
+        }
+        logging.info(f"{len(adoptedOrders[client_id])} unmapped orders on {client_id} can be adopted")
+
+
+def queueReconcile(call):
+    """Remember the latest master event a child missed so it can be replayed later"""
+    client_id = call.accDetail['client_id']
+    orderdata = call.orderdata
+    pending = reconcileQueue.setdefault(client_id, {})
+    if orderdata['order_id'] not in pending:
+        logging.warning(f"Queued order {orderdata['order_id']} for reconciliation on {client_id}")
+        recordEvent('child_skipped', order_id=orderdata['order_id'], client_id=client_id,
+                    status='SKIPPED', message=breakers[client_id].last_error)
+    pending[orderdata['order_id']] = orderdata
+
+
+def dropReconcile(client_id):
+    """Forget the orders queued for a child; the kill switch flattened it"""
+    for order_id in reconcileQueue.pop(client_id, {}):
+        logging.warning(f"Copying halted by kill switch, order {order_id} not reconciled on {client_id}")
+        recordEvent('copy_halted', order_id=order_id, client_id=client_id, status='SKIPPED',
+                    message='kill switch engaged')
+
+
+def reconcileChild(accDetail):
+    """Bring a recovered child in line with the latest state of the orders it missed"""
+    client_id = accDetail['client_id']
+    if copyingHalted():
+        dropReconcile(client_id)
+        return
+    pending = reconcileQueue.pop(client_id, {})
+    logging.info(f"Reconciling {len(pending)} orders on {client_id}")
+    
+    calls = []
+    for order_id, orderdata in pending.items():
+        if copyMode == 'fill':
+            calls += fillTargetOrder(orderdata, accDetail)
+        elif orderdata.get('order_status') == 'CANCELLED':
+            calls += cancelTargetOrder(orderdata, accDetail)
+        elif getTargetOrder(order_id, client_id):
+            calls += updateTargetOrder(orderdata, accDetail)
+        else:
+            calls += createTargetOrder(orderdata, accDetail)
+    callChildren(calls)
+
+
+def probeChild(accDetail):
+    """Half-open check: one cheap call decides whether the breaker closes"""
+    client_id = accDetail['client_id']
+    response, latency_ms, error = timedCall(accDetail, 'get_fund_limits', {})
+    failed = error is not None or response.get('status') != 'success'
+    breakers[client_id].record(latency_ms, failed, error)
+    logging.info(f"Probe {client_id} {'failed' if failed else 'succeeded'} in {latency_ms:.0f} ms")
+
+
+def breakerMonitor(interval=1.0):
+    """Probe open breakers, reconcile recovered children and publish health"""
+    while True:
+        time.sleep(interval)
+        # Nothing queued before the kill switch may be replayed onto a flattened child
+        halted = copyingHalted()
+        if halted and reconcileQueue:
+            with copyLock:
+                for client_id in list(reconcileQueue):
+                    dropReconcile(client_id)
+        for accDetail in list(childaccts.values()):
+            client_id = accDetail['client_id']
+            breaker = breakers[client_id]
+            try:
+                if breaker.probe_due():
+                    probeChild(accDetail)
+                if not halted and breaker.state == CircuitBreaker.CLOSED and reconcileQueue.get(client_id):
+                    with copyLock:
+                        reconcileChild(accDetail)
+            except Exception as e:
+                stacktrace = traceback.format_exc()
+                logging.error(f"Breaker monitor error for {client_id} {e} - {stacktrace}")
+            if eventStore is not None and breaker.dirty:
+                eventStore.update_health(breaker.snapshot())
+
+
+def profileWatcher(interval=1.0):
+    """Open a profiling window when one is requested from the dashboard"""
+    handled = (eventStore.get_control(PROFILE_REQUEST) or {}).get('requested_at')
+    while True:
+        time.sleep(interval)
+        try:
+            request = eventStore.get_control(PROFILE_REQUEST) or {}
+            if request.get('requested_at') == handled:
+                continue
+            handled = request.get('requested_at')
+            if not profiler.start(*parse_profile_spec(f"{request.get('mode')}:{request.get('seconds', '')}")):
+                logging.warning('Profiling already running, request ignored')
+        except Exception as e:
+            logging.error(f"Profile request failed: {e}")
 
 
 def createTargetOrders(data):
     """Create orders in all child accounts"""
     logging.info('Inside create orders')
     sourceOrders[data['order_id']] = data
+    persistState('save_source_order', data['order_id'], data)
     
-    for childacct in childaccts:
-        accDetail = childaccts[childacct]
-        createTargetOrder(data, accDetail['client_id'], accDetail['dhanobj'], accDetail['multiplier'])
+    kwargs, quantities = translateOrder(data, childaccts.values())
+    callChildren([call for accDetail in childaccts.values()
+                  for call in createTargetOrder(data, accDetail, kwargs, quantities[accDetail['client_id']])])
 
 
-def createTargetOrder(orderdata, client_id, targetAccnt, multiplier):
-    """Create individual target order"""
-    logging.info(f'Creating order {orderdata["order_id"]} for {client_id}')
+def buildPlaceOrder(orderdata):
+    """Map Zerodha fields to Dhan place_order arguments, except quantity"""
+    plan = translationPlan(orderdata.get('exchange'), orderdata.get('transaction_type'),
+                           orderdata.get('product'), orderdata.get('order_type'),
+                           orderdata.get('validity'))
+    security_id = orderdata.get('instrument_token') or orderdata.get('security_id')
+    return dict(plan,
+                security_id=str(security_id),
+                price=float(orderdata.get('price', 0)),
+                trigger_price=float(orderdata.get('trigger_price', 0)))
 
+
+def lotSize(kwargs):
+    """Look up the lot size of the instrument being ordered"""
+    return instrumentLotSize(kwargs['exchange_segment'], kwargs['security_id'])
+
+
+@lru_cache(maxsize=4096)
+def instrumentLotSize(exchange_segment, security_id):
+    return (instrumentMaster.lot_size(exchange_segment, security_id)
+            or freezeTable.get(security_id)[1])
+
+
+def translateOrder(orderdata, accDetails):
+    """Translate a master order once for all children
+
+    Returns the place_order arguments every child shares (read only, each
+    leg copies them) and each child's quantity, scaled and rounded down to
+    whole lots in one pass.
+    """
+    accDetails = list(accDetails)
     try:
-        # Map Zerodha fields to Dhan fields
-        security_id = orderdata.get('instrument_token') or orderdata.get('security_id')
-        exchange_segment = map_exchange(orderdata.get('exchange'))
-        transaction_type = map_transaction_type(orderdata.get('transaction_type'))
-        product_type = map_product_type(orderdata.get('product'))
-        order_type = map_order_type(orderdata.get('order_type'))
-        validity = map_validity(orderdata.get('validity'))
-        quantity = int(round(int(orderdata['quantity']) * float(multiplier), 0))
-        price = float(orderdata.get('price', 0))
-        trigger_price = float(orderdata.get('trigger_price', 0))
-        
-        order_id = targetAccnt.place_order(
-            security_id=str(security_id),
-            exchange_segment=exchange_segment,
-            transaction_type=transaction_type,
-            quantity=quantity,
-            order_type=order_type,
-            product_type=product_type,
-            price=price,
-            trigger_price=trigger_price,
-            validity=validity
-        )
-        
-        storeTargetOrder(orderdata['order_id'], client_id, order_id['data']['order_id'])
-        logging.info(f"Created order {client_id} - {order_id['data']['order_id']}")
-        
+        kwargs = buildPlaceOrder(orderdata)
+        lot_size = lotSize(kwargs)
+        sized = sizeChildren(orderdata, accDetails)
+        scaled = [qty if raw is not None else None
+                  for qty, (raw, _) in zip(round_to_lots([raw or 0 for raw, _ in sized], lot_size), sized)]
     except Exception as e:
+        # Leave it to each child to report the bad order or multiplier
+        logging.error(f"Could not translate order {orderdata.get('order_id')}: {e}")
+        return None, {accDetail['client_id']: None for accDetail in accDetails}
+    
+    for accDetail, qty, (_, inputs) in zip(accDetails, scaled, sized):
+        recordEvent('child_sized', order_id=orderdata['order_id'], client_id=accDetail['client_id'],
+                    payload=dict(inputs, quantity=qty, lot_size=lot_size))
+    return kwargs, {accDetail['client_id']: qty for accDetail, qty in zip(accDetails, scaled)}
+
+
+def sizeChildren(orderdata, accDetails):
+    """Work out each child's quantity, before lot rounding, in one pass over cached margins
+
+    Returns ``(quantity, inputs)`` per child; ``inputs`` records what the
+    size was based on. Capital sizing falls back to the multiplier while a
+    margin is not cached yet. Notional sizing caps against the limit,
+    trigger or average fill price; with none of them the quantity is None
+    and ``inputs['refused']`` says why. The capital ratio is fixed the first time an
+    order is sized, so modifies and fills only rescale with the master
+    quantity instead of following the live margins.
+    """
+    quantity = int(orderdata['quantity'])
+    # MARKET and SL-M orders carry no limit price; the trigger or average
+    # fill price is the next best reference for the notional cap
+    price = float(orderdata.get('price') or orderdata.get('trigger_price') or orderdata.get('average_price') or 0)
+    master_available = marginCache.available(masterconfig.get('client_id'))
+    
+    sized = []
+    for accDetail in accDetails:
+        mode = accDetail.get('sizing', 'multiplier')
+        multiplier = float(accDetail['multiplier'])
+        inputs = {'mode': mode, 'multiplier': multiplier, 'master_quantity': quantity}
+        raw = quantity * multiplier
+        if mode == 'fixed':
+            raw = int(accDetail['fixed_quantity'])
+        elif mode == 'capital':
+            key = f"{orderdata['order_id']}|{accDetail['client_id']}"
+            ratio = childSizing.get(key)
+            if ratio is None:
+                available = marginCache.available(accDetail['client_id'])
+                inputs.update(child_available=available, master_available=master_available)
+                if available is None or not master_available:
+                    inputs['fallback'] = 'margins not cached'
+                    ratio = 1.0
+                else:
+                    ratio = available / master_available
+                childSizing[key] = ratio
+                persistState('save_sizing', orderdata['order_id'], accDetail['client_id'], ratio)
+            inputs['capital_ratio'] = ratio
+            raw = quantity * multiplier * ratio
+        elif mode == 'notional':
+            max_notional = float(accDetail['max_notional'])
+            inputs.update(price=price, max_notional=max_notional)
+            if price > 0:
+                raw = min(raw, max_notional / price)
+            else:
+                raw = None
+                inputs['refused'] = 'no reference price to cap the notional value'
+                logging.error(f"Notional cap for {orderdata['order_id']} on {accDetail['client_id']}: "
+                              f"no reference price, not copied")
+        inputs['raw_quantity'] = raw
+        sized.append((raw, inputs))
+    return sized
+
+
+def childLegs(orderdata, accDetail, kwargs, quantity=None):
+    """Scale and slice the child quantity into whole-lot legs"""
+    lot_size = lotSize(kwargs)
+    if quantity is None:
+        raw, inputs = sizeChildren(orderdata, [accDetail])[0]
+        if raw is None:
+            raise Exception(f"Sizing refused: {inputs['refused']}")
+        quantity = round_to_lots([raw], lot_size)[0]
+    if quantity <= 0:
+        raise Exception(f"Scaled quantity is below one lot of {lot_size}")
+    return freezeTable.slice(kwargs['security_id'], quantity, lot_size)
+
+
+def createTargetOrder(orderdata, accDetail, kwargs=None, quantity=None, tagPrefix='O'):
+    """Build the create calls for one child account, one per leg
+
+    ``kwargs`` and ``quantity`` come from translateOrder; they are worked
+    out here when the order is created for a single child. ``tagPrefix``
+    keeps the legs' correlation ids unique across fills of one order.
+    """
+    client_id = accDetail['client_id']
+    logging.info(f'Creating order {orderdata["order_id"]} for {client_id}')
+
+    def failed(e):
         stacktrace = traceback.format_exc()
-        logging.error(f"ERROR Order create error {e} - {stacktrace}")
+        logging.error(f"ERROR Order create error for {orderdata['order_id']} on {client_id}: {e} - {stacktrace}")
+        recordEvent('child_create', order_id=orderdata['order_id'], client_id=client_id,
+                    status='FAILED', message=str(e))
         print(f"Child order not created for parent order {orderdata['order_id']} for user id {client_id}")
 
+    try:
+        if kwargs is None:
+            kwargs = buildPlaceOrder(orderdata)
+        legs = childLegs(orderdata, accDetail, kwargs, quantity)
+    except Exception as e:
+        failed(e)
+        return []
+
+    if len(legs) > 1:
+        logging.info(f"Slicing order {orderdata['order_id']} for {client_id} into legs {legs}")
+    return [placeLegCall(orderdata, accDetail, kwargs, quantity, failed,
+                         correlation_tag(orderdata['order_id'], client_id, tagPrefix, leg))
+            for leg, quantity in enumerate(legs)]
+
+
+def placeLegCall(orderdata, accDetail, kwargs, quantity, failed, tag):
+    """Build the place call for one leg of a child order
+
+    ``tag`` is the leg's deterministic correlation id, which lets a standby
+    that takes over recognise legs the previous leader already placed.
+    """
+    client_id = accDetail['client_id']
+    kwargs = dict(kwargs, quantity=quantity, tag=tag)
+
+    def onDone(response, latency_ms, error):
+        try:
+            if error is not None:
+                raise error
+            child_oid = broker_data(response)['orderId']
+            storeTargetOrder(orderdata['order_id'], client_id, child_oid)
+            logging.info(f"Created order {client_id} - {child_oid} for {orderdata['order_id']} in {latency_ms:.1f} ms")
+            recordEvent('child_create', order_id=orderdata['order_id'], client_id=client_id,
+                        child_order_id=child_oid, status='PLACED', latency_ms=latency_ms,
+                        payload={'quantity': quantity, 'price': kwargs['price'],
+                                 'trigger_price': kwargs['trigger_price']})
+        except Exception as e:
+            failed(e)
+
+    return ChildCall(accDetail, 'place_order', kwargs, onDone, orderdata)
+
 
 def updateTargetOrders(data):
     """Update orders in all child accounts"""
     logging.info('Inside update orders')
     try:
         if checkifupdate(data):
-            for childacct in childaccts:
-                accDetail = childaccts[childacct]
-                updateTargetOrder(data, accDetail['client_id'], accDetail['dhanobj'], accDetail['multiplier'])
+            kwargs, quantities = translateOrder(data, childaccts.values())
+            callChildren([call for accDetail in childaccts.values()
+                          for call in updateTargetOrder(data, accDetail, kwargs, quantities[accDetail['client_id']])])
             sourceOrders[data['order_id']] = data
+            persistState('save_source_order', data['order_id'], data)
         else:
             logging.info(f"Order id {data['order_id']} not changed. Not updated to child accounts")
     except Exception as e:
         stacktrace = traceback.format_exc()
-        logging.error(f"ERROR Order update error {e} - {stacktrace}")
+        logging.error(f"ERROR Order update error for {data['order_id']}: {e} - {stacktrace}")
         print(f"Order mapping not found {data['order_id']}")
 
 
-def updateTargetOrder(orderdata, client_id, targetAccnt, multiplier):
-    """Update individual target order"""
+def updateTargetOrder(orderdata, accDetail, place_kwargs=None, quantity=None):
+    """Build the update calls for every leg of one child order
+
+    The new quantity is re-sliced: existing legs are modified, extra legs
+    are placed if the order grew and surplus legs cancelled if it shrank.
+    """
+    client_id = accDetail['client_id']
     logging.info(f'Updating order {orderdata["order_id"]} for {client_id}')
 
-    try:
-        targetorder = getTargetOrder(orderdata['order_id'], client_id)
-        if not targetorder:
+    def failed(e):
+        stacktrace = traceback.format_exc()
+        logging.error(f"ERROR Order update error for {orderdata['order_id']} on {client_id}: {e} - {stacktrace}")
+        recordEvent('child_update', order_id=orderdata['order_id'], client_id=client_id,
+                    status='FAILED', message=str(e))
+        print(f"Child order not updated for parent order {orderdata['order_id']} for user id {client_id}")
+
+    targetorders = list(getTargetOrder(orderdata['order_id'], client_id) or [])
+    adoptOnly = False
+    if not targetorders:
+        pending = reconcileQueue.get(client_id, {})
+        if orderdata['order_id'] in pending:
+            # Still waiting to be created on this child; create it with the latest values
+            pending[orderdata['order_id']] = orderdata
+            return []
+        if not adoptedOrders.get(client_id):
             logging.error(f"Target order not found for {orderdata['order_id']} - {client_id}")
-            return
-            
+            return []
+        # The legs may have been placed by the previous leader just before a
+        # takeover; pick up the ones the child has, but place nothing new
+        adoptOnly = True
+
+    try:
         # Map fields for Dhan
-        exchange_segment = map_exchange(orderdata.get('exchange'))
-        transaction_type = map_transaction_type(orderdata.get('transaction_type'))
-        product_type = map_product_type(orderdata.get('product'))
-        order_type = map_order_type(orderdata.get('order_type'))
-        validity = map_validity(orderdata.get('validity'))
-        quantity = int(round(int(orderdata['quantity']) * float(multiplier), 0))
-        price = float(orderdata.get('price', 0))
-        trigger_price = float(orderdata.get('trigger_price', 0))
-        
-        result = targetAccnt.modify_order(
-            order_id=targetorder,
-            order_type=order_type,
-            quantity=quantity,
-            price=price,
-            trigger_price=trigger_price,
-            validity=validity
-        )
-        
-        logging.info(f"Updated order {client_id} - {targetorder}")
-        
+        if place_kwargs is None:
+            place_kwargs = buildPlaceOrder(orderdata)
+        legs = childLegs(orderdata, accDetail, place_kwargs, quantity)
     except Exception as e:
-        stacktrace = traceback.format_exc()
-        logging.error(f"ERROR Order update error {e} - {stacktrace}")
-        print(f"Child order not updated for parent order {orderdata['order_id']} for user id {client_id}")
+        failed(e)
+        return []
+
+    calls = [modifyLegCall(orderdata, accDetail, place_kwargs, targetorder, quantity, failed)
+             for targetorder, quantity in zip(targetorders, legs)]
+    for leg in range(len(targetorders), len(legs)):
+        tag = correlation_tag(orderdata['order_id'], client_id, 'O', leg)
+        adopted = adoptedOrders.get(client_id, {}).pop(tag, None)
+        if adopted is not None:
+            # Placed by the previous leader with the values it knew; bring it
+            # up to date rather than treating the place as done
+            calls += takeOverLeg(orderdata, accDetail, adopted, place_kwargs, legs[leg], failed)
+        elif not adoptOnly:
+            calls.append(placeLegCall(orderdata, accDetail, place_kwargs, legs[leg], failed, tag))
+    calls += [cancelLegCall(orderdata, accDetail, targetorder, dropLeg=True)
+              for targetorder in targetorders[len(legs):]]
+    return calls
+
+
+def modifyLegCall(orderdata, accDetail, place_kwargs, targetorder, quantity, failed):
+    """Build the modify call for one leg of a child order"""
+    client_id = accDetail['client_id']
+    kwargs = {
+        'order_id': targetorder,
+        'order_type': place_kwargs['order_type'],
+        'leg_name': 'ENTRY_LEG',
+        'quantity': quantity,
+        'price': place_kwargs['price'],
+        'trigger_price': place_kwargs['trigger_price'],
+        'disclosed_quantity': 0,
+        'validity': place_kwargs['validity']
+    }
+
+    def onDone(response, latency_ms, error):
+        try:
+            if error is not None:
+                raise error
+            broker_data(response)
+            logging.info(f"Updated order {client_id} - {targetorder} for {orderdata['order_id']} in {latency_ms:.1f} ms")
+            recordEvent('child_update', order_id=orderdata['order_id'], client_id=client_id,
+                        child_order_id=targetorder, status='MODIFIED', latency_ms=latency_ms,
+                        payload={'quantity': quantity, 'price': kwargs['price'],
+                                 'trigger_price': kwargs['trigger_price']})
+        except Exception as e:
+            failed(e)
+
+    return ChildCall(accDetail, 'modify_order', kwargs, onDone, orderdata)
 
 
 def cancelTargetOrders(data):
     """Cancel orders in all child accounts"""
-    for childacct in childaccts:
-        accDetail = childaccts[childacct]
-        cancelTargetOrder(data, accDetail['client_id'], accDetail['dhanobj'])
+    callChildren([call for accDetail in childaccts.values() for call in cancelTargetOrder(data, accDetail)])
 
 
-def cancelTargetOrder(orderdata, client_id, targetAccnt): 
-    """Cancel individual target order"""
+def cancelTargetOrder(orderdata, accDetail):
+    """Build the cancel calls for every leg of one child order"""
+    client_id = accDetail['client_id']
     logging.info(f'Cancelling order {orderdata["order_id"]} for {client_id}')
-    try:
-        targetorder = getTargetOrder(orderdata['order_id'], client_id)
-        if targetorder:
-            result = targetAccnt.cancel_order(order_id=targetorder)
-            logging.info(f"Cancelled order {client_id} - {targetorder}")
-    except Exception as e:
-        stacktrace = traceback.format_exc()
-        logging.error(f"Order cancel error {e} - {stacktrace}")
+    targetorders = getTargetOrder(orderdata['order_id'], client_id)
+    if not targetorders:
+        # Legs the previous leader placed but never recorded are still live
+        targetorders = []
+        for leg in adoptedLegs(orderdata['order_id'], client_id):
+            adoptOrderLeg(orderdata, client_id, leg)
+            targetorders.append(leg['orderId'])
+    if not targetorders:
+        # Never reached this child, so there is nothing left to create or cancel
+        reconcileQueue.get(client_id, {}).pop(orderdata['order_id'], None)
+        return []
+
+    return [cancelLegCall(orderdata, accDetail, targetorder) for targetorder in targetorders]
+
+
+def cancelLegCall(orderdata, accDetail, targetorder, dropLeg=False):
+    """Build the cancel call for one leg of a child order"""
+    client_id = accDetail['client_id']
+
+    def onDone(response, latency_ms, error):
+        try:
+            if error is not None:
+                raise error
+            broker_data(response)
+            if dropLeg:
+                dropTargetOrder(orderdata['order_id'], client_id, targetorder)
+            logging.info(f"Cancelled order {client_id} - {targetorder} for {orderdata['order_id']} in {latency_ms:.1f} ms")
+            recordEvent('child_cancel', order_id=orderdata['order_id'], client_id=client_id,
+                        child_order_id=targetorder, status='CANCELLED', latency_ms=latency_ms)
+        except Exception as e:
+            stacktrace = traceback.format_exc()
+            logging.error(f"Order cancel error for {orderdata['order_id']} on {client_id}: {e} - {stacktrace}")
+            recordEvent('child_cancel', order_id=orderdata['order_id'], client_id=client_id,
+                        status='FAILED', message=str(e))
+
+    return ChildCall(accDetail, 'cancel_order', {'order_id': targetorder}, onDone, orderdata)
+
+
+def fillOrder(orderdata):
+    """Market order for the master's cumulative filled quantity"""
+    return dict(orderdata, order_type='MARKET', price=0, trigger_price=0, validity='DAY',
+                quantity=filled_quantity(orderdata))
+
+
+def copyFills(data):
+    """Copy-on-fill: send each child the quantity filled on the master since the last update"""
+    filled = filled_quantity(data)
+    if filled <= 0:
+        logging.info(f"Order {data['order_id']} has no fills yet, nothing to copy")
+        return
+    
+    orderdata = fillOrder(data)
+    kwargs, quantities = translateOrder(orderdata, childaccts.values())
+    callChildren([call for accDetail in childaccts.values()
+                  for call in fillTargetOrder(orderdata, accDetail, kwargs, quantities[accDetail['client_id']])])
+
+
+def fillTargetOrder(orderdata, accDetail, kwargs=None, target=None):
+    """Build market order calls for the part of a fill one child has not received yet
+
+    ``orderdata`` comes from fillOrder; ``target`` is the child's scaled share
+    of the master's cumulative fill.
+    A leg counts as sent unless the broker definitely rejected it, since a
+    call that errored out may still have reached the exchange.
+    """
+    client_id = accDetail['client_id']
+    key = f"{orderdata['order_id']}|{client_id}"
+    if target is None:
+        kwargs, quantities = translateOrder(orderdata, [accDetail])
+        target = quantities[client_id]
+    if target is None:
+        recordEvent('child_create', order_id=orderdata['order_id'], client_id=client_id,
+                    status='FAILED', message='could not scale fill')
+        return []
+    
+    delta = target - childFilled.get(key, 0)
+    if delta <= 0:
+        return []
+    logging.info(f"Copying fill of {delta} on order {orderdata['order_id']} to {client_id}")
+    
+    calls = createTargetOrder(orderdata, accDetail, kwargs, delta, tagPrefix=f"F{childFilled.get(key, 0)}")
+    return [countedFill(call, key) for call in calls]
+
+
+def countedFill(call, key):
+    """Add a fill leg's quantity to what its child has been sent, once the broker took it"""
+    def onDone(response, latency_ms, error):
+        rejected = (isinstance(response, dict) and response.get('status') != 'success'
+                    and isinstance(response.get('remarks'), dict))
+        if not rejected:
+            childFilled[key] = childFilled.get(key, 0) + call.kwargs['quantity']
+            persistState('save_fill', call.orderdata['order_id'], call.accDetail['client_id'], childFilled[key])
+        call.onDone(response, latency_ms, error)
+    return call._replace(onDone=onDone)
 
 
 def checkifupdate(orderdata):
@@ -248,84 +977,84 @@ def checkifupdate(orderdata):
 
 
 def showMarginsAvailable():
-    """Display margin information for all accounts"""
-    print('---Client ID--------Available--------Used---------Cash Available-----------')
-    showMargin(dhan=dhanmaster, client_id=masterconfig['client_id'])
+    """Display cached margin information for all accounts"""
+    print('---Client ID--------Available--------Used---------Age (s)-----------')
+    showMargin(client_id=masterconfig['client_id'])
     
     for childacct in childaccts:
-        accDetail = childaccts[childacct]
-        showMargin(dhan=accDetail['dhanobj'], client_id=accDetail['client_id'])
+        showMargin(client_id=childaccts[childacct]['client_id'])
     print('--------------------------------------------------------------------')
 
 
-def showMargin(dhan, client_id):
-    """Show margin details for a specific account"""
-    try:
-        margin = dhan.get_fund_limits()
-        if margin['status'] == 'success':
-            funds = margin['data']
-            available = funds.get('equity_amount', 0) + funds.get('commodity_amount', 0)
-            used = funds.get('utilised_amount', 0)
-            cash = funds.get('opening_balance', 0)
-            print(f"{client_id:15} : {available:12,.0f}  {used:12,.0f}  {cash:12,.0f}")
-        else:
-            logging.error(f"Failed to fetch margins for {client_id}")
-    except Exception as e:
-        logging.error(f"Error fetching margins for {client_id}: {e}")
+def showMargin(client_id):
+    """Show cached margin details for a specific account"""
+    funds = marginCache.get(client_id)
+    if funds is None:
+        print(f"{client_id:15} : margins not fetched yet")
+    else:
+        print(f"{client_id:15} : {funds['available']:12,.0f}  {funds['used']:12,.0f}  "
+              f"{marginCache.age(client_id):8.0f}")
+
+
+def marginAccounts():
+    """Accounts whose margins the background refresh keeps current"""
+    accounts = {acc['client_id']: acc['dhanobj'] for acc in childaccts.values()}
+    if dhanmaster is not None:
+        accounts[masterconfig['client_id']] = dhanmaster
+    return accounts
+
+
+def sessionAccounts():
+    """Accounts the pre-open session check validates and warms"""
+    return {client_id: (dhan, tokenExpiry.get(client_id)) for client_id, dhan in marginAccounts().items()}
+
+
+def reportSessions(report):
+    """Record the session check and call out accounts that will fail"""
+    for client_id, result in report.items():
+        recordEvent('session_check', client_id=client_id, status='READY' if result['ok'] else 'FAILING',
+                    latency_ms=result['latency_ms'], message=result['error'])
+        if not result['ok']:
+            print(f"WARNING: account {client_id} will fail: {result['error']}")
+    if eventStore is not None:
+        eventStore.set_control(SESSION_REPORT, {'checked_at': time.time(), 'accounts': report})
 
 
 def map_exchange(exchange):
     """Map exchange codes"""
-    exchange_map = {
-        'NSE': dhanhq.NSE,
-        'BSE': dhanhq.BSE,
-        'NFO': dhanhq.NFO,
-        'BFO': dhanhq.BFO,
-        'MCX': dhanhq.MCX
-    }
-    return exchange_map.get(exchange, dhanhq.NSE)
+    return EXCHANGE_MAP.get(exchange, EXCHANGE_MAP['NSE'])
 
 
 def map_transaction_type(transaction_type):
     """Map transaction types"""
-    if transaction_type == 'BUY':
-        return dhanhq.BUY
-    elif transaction_type == 'SELL':
-        return dhanhq.SELL
-    return dhanhq.BUY
+    return TRANSACTION_MAP.get(transaction_type, TRANSACTION_MAP['BUY'])
 
 
 def map_product_type(product):
     """Map product types"""
-    product_map = {
-        'MIS': dhanhq.INTRA,
-        'CNC': dhanhq.CNC,
-        'NRML': dhanhq.MARGIN,
-        'CO': dhanhq.CO,
-        'BO': dhanhq.BO
-    }
-    return product_map.get(product, dhanhq.CNC)
+    return PRODUCT_MAP.get(product, PRODUCT_MAP['CNC'])
 
 
 def map_order_type(order_type):
     """Map order types"""
-    order_map = {
-        'MARKET': dhanhq.MARKET,
-        'LIMIT': dhanhq.LIMIT,
-        'SL': dhanhq.STOP_LOSS,
-        'SL-M': dhanhq.STOP_LOSS_MARKET
-    }
-    return order_map.get(order_type, dhanhq.MARKET)
+    return ORDER_TYPE_MAP.get(order_type, ORDER_TYPE_MAP['MARKET'])
 
 
 def map_validity(validity):
     """Map validity types"""
-    if validity == 'DAY':
-        return dhanhq.DAY
-    elif validity == 'IOC':
-        return dhanhq.IOC
-    else:
-        return dhanhq.DAY
+    return VALIDITY_MAP.get(validity, VALIDITY_MAP['DAY'])
+
+
+@lru_cache(maxsize=256)
+def translationPlan(exchange, transaction_type, product, order_type, validity):
+    """Translate one master order shape into the Dhan fields every child shares"""
+    return MappingProxyType({
+        'exchange_segment': map_exchange(exchange),
+        'transaction_type': map_transaction_type(transaction_type),
+        'order_type': map_order_type(order_type),
+        'product_type': map_product_type(product),
+        'validity': map_validity(validity)
+    })
 
 
 def setup_live_feed():
@@ -335,29 +1064,128 @@ def setup_live_feed():
     raise Exception("DhanLiveFeed not available in current dhanhq package version")
 
 
-def main():
+def check_config(cfg):
+    """Validate configuration and token decryption without any network calls"""
+    problems = []
+    children = cfg.get('CHILD') or {}
+    accounts = [('MASTER', cfg.get('MASTER') or {})]
+    accounts += [(f"CHILD {name}", child) for name, child in children.items()]
+
+    for label, acct in accounts:
+        if not acct.get('client_id'):
+            problems.append(f"{label}: client_id is missing")
+        if not acct.get('access_token'):
+            problems.append(f"{label}: access_token is missing")
+            continue
+        try:
+            expires_at = token_expiry(deCryptPwd(acct['access_token']))
+        except Exception:
+            problems.append(f"{label}: access_token cannot be decrypted with the current key")
+            continue
+        if expires_at is not None and expires_at <= time.time():
+            problems.append(f"{label}: access_token expired at {time.strftime('%Y-%m-%d %H:%M', time.localtime(expires_at))}")
+
+    for name, child in children.items():
+        problems += [f"CHILD {name}: {problem}" for problem in child_problems(child)]
+
+    if not isinstance(cfg.get('DONOTPROCESSPROD', []), list):
+        problems.append("DONOTPROCESSPROD must be a list of product types")
+
+    return problems
+
+
+def replay_events(path):
+    """Feed order updates from a JSON-lines file through the copy engine"""
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                on_order_update(json.loads(line))
+
+
+def parse_args(argv=None):
+    """Parse command line arguments"""
+    parser = argparse.ArgumentParser(description='Copy orders from a master Dhan account to child accounts')
+    parser.add_argument('--config', default=configFile, help='path to the configuration file')
+    parser.add_argument('--check', action='store_true',
+                        help='validate the configuration and token decryption without connecting, then exit')
+    parser.add_argument('--shadow', action='store_true',
+                        help='compute and log every child order without placing anything')
+    parser.add_argument('--replay', metavar='FILE',
+                        help='read order updates from a JSON-lines file instead of the live feed')
+    parser.add_argument('--ha', action='store_true',
+                        help='run as a hot standby pair: only the process holding the leader lock copies orders')
+    args = parser.parse_args(argv)
+    if args.ha and args.shadow:
+        parser.error('--ha needs the order history store, which --shadow does not use')
+    return args
+
+
+def main(argv=None):
     """Main execution function"""
-    global dhanmaster, masterconfig, prodFilter, childaccts
+    global dhanmaster, masterconfig, prodFilter, childaccts, eventStore, config, shadowMode, brokerLoop, freezeTable, instrumentMaster, sequencer, copyMode, haMode, sessionGuard
+    
+    args = parse_args(argv)
+    started = time.perf_counter()
     
     # Load configuration
+    config = load_config(args.config)
+    load_encryption_key()
+    
+    if args.check:
+        problems = check_config(config)
+        for problem in problems:
+            print(f"ERROR: {problem}")
+        print(f"Config check {'failed' if problems else 'passed'} in {(time.perf_counter() - started) * 1000:.1f} ms")
+        return 1 if problems else 0
+    
+    setup_logging()
+    logging.info("Program Dhan Copytrader started")
+    
+    shadowMode = args.shadow
+    haMode = args.ha
     masterconfig = config['MASTER']
     prodFilter = config.get('DONOTPROCESSPROD', [])
+    copyMode = config.get('COPY_MODE', 'order')
+    freezeTable = FreezeTable.load(config.get('FREEZE_LIMITS'))
+    instrumentMaster = InstrumentMaster.load(config.get('INSTRUMENT_MASTER'))
+    instrumentLotSize.cache_clear()
+    sequencer = EventSequencer(copyTrade, window_ms=config.get('REORDER_WINDOW_MS', 50),
+                               on_suppressed=onSuppressed)
+    loadBrokerClient()
     
-    logging.info('Connecting to Master account')
+    if shadowMode:
+        # Shadow orders must not end up in the real order history
+        logging.info('Running in shadow mode, no orders will be placed')
+        print('Shadow mode: child orders are logged, not placed')
+    else:
+        eventStore = EventStore(config.get('EVENT_STORE', DEFAULT_DB_PATH))
+        atexit.register(eventStore.flush)
+        
+        if config.get('BROKER_BACKEND', 'threaded') == 'async':
+            brokerLoop = AsyncBroker(base_url=config.get('BROKER_URL', DHAN_API_URL),
+                                     pool_size=config.get('BROKER_POOL_SIZE', 100))
+            brokerLoop.start()
+            atexit.register(brokerLoop.stop)
+            logging.info('Using async broker backend')
     
-    try:
-        # Connect to master account
-        dhanmaster = create_dhan_connection(masterconfig)
-        print(f'Master account {masterconfig["client_id"]} connection successful')
+    if not (shadowMode and args.replay):
+        logging.info('Connecting to Master account')
         
-    except Exception as e:
-        stacktrace = traceback.format_exc()
-        logging.error(f"Connection Error {e} - {stacktrace}")
-        print(f"Connection error for master client id: {masterconfig['client_id']}. Exiting program!")
-        sys.exit(1)
+        try:
+            # Connect to master account
+            dhanmaster = create_dhan_connection(masterconfig)
+            print(f'Master account {masterconfig["client_id"]} connection successful')
+            
+        except Exception as e:
+            stacktrace = traceback.format_exc()
+            logging.error(f"Connection Error {e} - {stacktrace}")
+            print(f"Connection error for master client id: {masterconfig['client_id']}. Exiting program!")
+            sys.exit(1)
     
     # Connect to child accounts
     logging.info('Connecting to target accounts')
+    breakerConfig = config.get('CIRCUIT_BREAKER', {})
     
     for childacct in config['CHILD']:
         child = {}
@@ -367,10 +1195,20 @@ def main():
             try:
                 child['client_id'] = childconfig['client_id']
                 child['multiplier'] = childconfig['multiplier']
-                child['dhanobj'] = create_dhan_connection(childconfig)
+                child['sizing'] = childconfig.get('sizing', 'multiplier')
+                child['fixed_quantity'] = childconfig.get('fixed_quantity')
+                child['max_notional'] = childconfig.get('max_notional')
+                if shadowMode:
+                    child['dhanobj'] = ShadowAccount(childconfig['client_id'])
+                else:
+                    child['dhanobj'] = create_dhan_connection(childconfig)
                 
                 childaccts[child['client_id']] = child
-                print(f"Child account {child['client_id']} connection successful")
+                breakers[child['client_id']] = CircuitBreaker(child['client_id'], **breakerConfig)
+                if shadowMode:
+                    print(f"Child account {child['client_id']} shadowed")
+                else:
+                    print(f"Child account {child['client_id']} connection successful")
                 
             except Exception as e:
                 stacktrace = traceback.format_exc()
@@ -378,8 +1216,47 @@ def main():
                 print(f"Connection error for client id: {childconfig['client_id']}. Skipping this account.")
                 continue
     
+    if haMode:
+        waitForLeadership(LeaderLock(config.get('HA_LOCK', DEFAULT_LOCK_PATH)))
+    
+    if not shadowMode:
+        # The margin refresh doubles as the keep-alive heartbeat for every
+        # account's pooled connection
+        marginCache.refresh_interval = config.get('MARGIN_REFRESH_SECONDS', 30)
+        marginCache.start(marginAccounts)
+        sessionGuard = SessionGuard(market_open=config.get('MARKET_OPEN', '09:15'),
+                                    market_close=config.get('MARKET_CLOSE', '15:30'),
+                                    warmup_minutes=config.get('PREOPEN_WARMUP_MINUTES', 10),
+                                    on_funds=marginCache.update, on_report=reportSessions)
+        sessionGuard.check(sessionAccounts())
+        sessionGuard.start(sessionAccounts)
+    
+    monitor = threading.Thread(target=breakerMonitor, name='breaker-monitor')
+    monitor.daemon = True
+    monitor.start()
+    
+    profiler.out_dir = config.get('PROFILE_DIR', DEFAULT_PROFILE_DIR)
+    if os.getenv('COPYTRADE_PROFILE'):
+        try:
+            profiler.start(*parse_profile_spec(os.getenv('COPYTRADE_PROFILE')))
+        except ValueError as e:
+            logging.error(f"Ignoring COPYTRADE_PROFILE: {e}")
+    if eventStore is not None:
+        watcher = threading.Thread(target=profileWatcher, name='profile-watcher')
+        watcher.daemon = True
+        watcher.start()
+    
+    logging.info(f"Startup completed in {(time.perf_counter() - started) * 1000:.1f} ms")
+    
+    if args.replay:
+        replay_events(args.replay)
+        sequencer.flush()
+        logging.info(f"Order updates: {sequencer.stats()}")
+        return 0
+    
     # Show initial margin information
-    showMarginsAvailable()
+    if not shadowMode:
+        showMarginsAvailable()
     
     # Setup live feed for order updates (if available)
     try:
@@ -405,7 +1282,7 @@ def main():
 
 if __name__ == "__main__":
     try:
-        main()
+        sys.exit(main())
     except KeyboardInterrupt:
         print("\nProgram interrupted by user")
     except Exception as e:
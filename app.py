@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, Response, send_from_directory
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 from flask_wtf import FlaskForm, CSRFProtect
 from flask_socketio import SocketIO, emit
@@ -10,6 +10,11 @@ import threading
 import time
 from core.dhan_trader import DhanTrader
 from core.encryption import EncryptionManager
+from core.event_store import EventStore, DEFAULT_DB_PATH, COPY_HALTED, PROFILE_REQUEST, SESSION_REPORT
+from core.analytics import CopyAnalytics
+from core.account_import import read_accounts_csv
+from core.common import count_statuses
+from core.profiler import DEFAULT_PROFILE_DIR, DUMP_NAME, list_dumps, parse_profile_spec
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -58,6 +63,8 @@ class MasterAccountForm(FlaskForm):
 
 # Global trader instance
 trader = None
+event_store = None
+analytics = None
 
 def initialize_trader():
     """Initialize the trading system"""
@@ -69,6 +76,23 @@ def initialize_trader():
         print(f"Failed to initialize trader: {e}")
         return False
 
+def get_event_store():
+    """Open the order event history store on first use"""
+    global event_store
+    if event_store is None:
+        path = DEFAULT_DB_PATH
+        if trader is not None:
+            path = trader.config.get('EVENT_STORE', DEFAULT_DB_PATH)
+        event_store = EventStore(path)
+    return event_store
+
+def get_analytics():
+    """Open the copy analytics tables next to the order event history"""
+    global analytics
+    if analytics is None:
+        analytics = CopyAnalytics(get_event_store().path)
+    return analytics
+
 # Routes
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -227,6 +251,24 @@ def api_child_accounts():
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 400
 
+@app.route('/api/accounts/children/import', methods=['POST'])
+@login_required
+def api_import_child_accounts():
+    """Add child accounts in bulk from an uploaded CSV, reporting the result of each row"""
+    if not trader:
+        return jsonify({'success': False, 'error': 'Trading system not initialized'}), 500
+    try:
+        upload = request.files.get('file')
+        rows = read_accounts_csv(upload.read() if upload else request.get_data())
+        results = trader.import_child_accounts(
+            rows,
+            replace=request.args.get('replace') == '1',
+            validate=request.args.get('validate', '1') != '0'
+        )
+        return jsonify({'success': True, 'counts': count_statuses(results), 'results': results})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @app.route('/api/accounts/children/<name>', methods=['PUT', 'DELETE'])
 @login_required
 def api_child_account_detail(name):
@@ -318,10 +360,137 @@ def api_trading_status():
             'active': trader.is_active if hasattr(trader, 'is_active') else False,
             'master_connected': trader.master_connected if hasattr(trader, 'master_connected') else False,
             'children_count': len(trader.connected_children) if hasattr(trader, 'connected_children') else 0,
+            'copy_halted': bool(get_event_store().get_control(COPY_HALTED, False)),
             'last_update': time.time()
         })
     return jsonify({'active': False, 'master_connected': False, 'children_count': 0})
 
+@app.route('/api/trading/kill', methods=['POST'])
+@login_required
+def api_trading_kill():
+    """Stop copying, cancel open orders and square off positions on every child"""
+    if not trader or not trader.is_initialized:
+        return jsonify({'success': False, 'error': 'Trading system not initialized'}), 500
+    try:
+        report = trader.kill_switch(get_event_store())
+        socketio.emit('kill_switch', report)
+        return jsonify(dict(report, success=True))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/trading/resume', methods=['POST'])
+@login_required
+def api_trading_resume():
+    """Let the copy engine copy master orders again after a kill switch"""
+    try:
+        get_event_store().set_control(COPY_HALTED, False)
+        return jsonify({'success': True, 'message': 'Copying resumed'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/accounts/health')
+@login_required
+def api_account_health():
+    """Get circuit breaker state and health score per child account"""
+    try:
+        return jsonify(get_event_store().get_health())
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/accounts/sessions')
+@login_required
+def api_account_sessions():
+    """Get the copy engine's latest pre-open token and connection check"""
+    try:
+        return jsonify(get_event_store().get_control(SESSION_REPORT) or {'checked_at': None, 'accounts': {}})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/orders')
+@login_required
+def api_orders():
+    """Get order event history, newest first, one page at a time"""
+    try:
+        page = get_event_store().query_events(
+            cursor=request.args.get('cursor', type=int),
+            limit=request.args.get('limit', 100, type=int),
+            order_id=request.args.get('order_id'),
+            client_id=request.args.get('client_id'),
+            status=request.args.get('status'),
+            event=request.args.get('event'),
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float)
+        )
+        return jsonify(page)
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/analytics/report')
+@login_required
+def api_analytics_report():
+    """Get per-child slippage, fill lag and fill ratio, optionally pulling fresh trade books"""
+    try:
+        ingested = None
+        if request.args.get('refresh'):
+            if not trader or not trader.is_initialized:
+                return jsonify({'success': False, 'error': 'Trading system not initialized'}), 500
+            ingested = get_analytics().ingest(trader.trade_book_accounts(),
+                                              from_date=request.args.get('from_date'),
+                                              to_date=request.args.get('to_date'))
+        report = get_analytics().report(
+            since=request.args.get('since', type=float),
+            until=request.args.get('until', type=float)
+        )
+        return jsonify({'success': True, 'report': report, 'ingested': ingested})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/analytics/export')
+@login_required
+def api_analytics_export():
+    """Download the per-order slippage and lag rows as CSV"""
+    rows = get_analytics().export_csv(
+        since=request.args.get('since', type=float),
+        until=request.args.get('until', type=float)
+    )
+    return Response(rows, mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=copy_analytics.csv'})
+
+def profile_dir():
+    """Directory the copy engine writes profile dumps to"""
+    if trader is not None:
+        return os.path.abspath(trader.config.get('PROFILE_DIR', DEFAULT_PROFILE_DIR))
+    return os.path.abspath(DEFAULT_PROFILE_DIR)
+
+@app.route('/api/profile', methods=['GET', 'POST'])
+@login_required
+def api_profile():
+    """List profile dumps, or ask the copy engine to profile the copy path for a while"""
+    if request.method == 'GET':
+        return jsonify({
+            'request': get_event_store().get_control(PROFILE_REQUEST),
+            'dumps': list_dumps(profile_dir())
+        })
+    
+    try:
+        data = request.json or {}
+        mode, seconds = parse_profile_spec(f"{data.get('mode', 'sample')}:{data.get('seconds', '')}")
+        profile_request = {'mode': mode, 'seconds': seconds, 'requested_at': time.time()}
+        get_event_store().set_control(PROFILE_REQUEST, profile_request)
+        return jsonify({'success': True, 'request': profile_request,
+                        'message': f'Profiling ({mode}) requested for {seconds:g} seconds'})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/api/profile/<name>')
+@login_required
+def api_profile_dump(name):
+    """Download one profile dump (collapsed stacks, pstats or text summary)"""
+    if not DUMP_NAME.match(name):
+        return jsonify({'success': False, 'error': 'Unknown profile dump'}), 404
+    return send_from_directory(profile_dir(), name, as_attachment=not name.endswith('.txt'),
+                               mimetype='text/plain' if not name.endswith('.pstats') else None)
+
 # WebSocket events
 @socketio.on('connect')
 def handle_connect():
@@ -0,0 +1,129 @@
+import csv
+import io
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dhanhq import dhanhq
+from .common import child_problems, count_statuses
+
+IMPORT_COLUMNS = ('name', 'client_id', 'access_token', 'multiplier', 'enabled',
+                  'sizing', 'fixed_quantity', 'max_notional')
+REQUIRED_COLUMNS = ('name', 'client_id', 'access_token')
+
+
+def connect_account(client_id, access_token):
+    """Open a Dhan connection and check the token with a fund limit call"""
+    dhan = dhanhq(client_id=client_id, access_token=access_token)
+    test = dhan.get_fund_limits()
+    if test.get('status') != 'success':
+        raise Exception(test.get('remarks'))
+    return dhan
+
+
+def parse_row(row):
+    """Turn one CSV row into a CHILD config entry, raising ValueError if it is invalid"""
+    missing = [column for column in REQUIRED_COLUMNS if not (row.get(column) or '').strip()]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+
+    account = {
+        'client_id': row['client_id'].strip(),
+        'access_token': row['access_token'].strip(),
+        'multiplier': float(row.get('multiplier') or 1.0),
+        'enabled': (row.get('enabled') or 'Y').strip().upper()
+    }
+    if (row.get('sizing') or '').strip():
+        account['sizing'] = row['sizing'].strip()
+    if (row.get('fixed_quantity') or '').strip():
+        account['fixed_quantity'] = int(row['fixed_quantity'])
+    if (row.get('max_notional') or '').strip():
+        account['max_notional'] = float(row['max_notional'])
+    problems = child_problems(account)
+    if problems:
+        raise ValueError('; '.join(problems))
+    return row['name'].strip(), account
+
+
+def read_accounts_csv(source):
+    """Read account rows from CSV text or a file object
+
+    Returns ``[(line, row)]`` with the CSV line number of each data row.
+    """
+    if isinstance(source, bytes):
+        source = source.decode('utf-8-sig')
+    if isinstance(source, str):
+        source = io.StringIO(source)
+    reader = csv.DictReader(source)
+    columns = [column.strip().lower() for column in reader.fieldnames or []]
+    missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+    if missing:
+        raise ValueError(f"CSV header is missing {', '.join(missing)}")
+    reader.fieldnames = columns
+    return [(reader.line_num, row) for row in reader]
+
+
+def import_accounts(config, rows, encryption_manager, connect=None, replace=False, workers=32):
+    """Add CSV account rows to ``config['CHILD']`` in one pass
+
+    Valid rows have their tokens encrypted together and, when ``connect``
+    is given, their sessions tested concurrently with
+    ``connect(client_id, access_token)``. Only rows that pass are added.
+    Existing names are skipped unless ``replace`` is set. The caller writes
+    the config once afterwards.
+
+    Returns ``(results, connections)``: one result per row, in file order,
+    and ``{name: connection}`` for the enabled accounts that connected.
+    """
+    children = config.setdefault('CHILD', {})
+    results = []
+    accepted = []
+    seen = set()
+    for line, row in rows:
+        result = {'line': line, 'name': (row.get('name') or '').strip(),
+                  'client_id': (row.get('client_id') or '').strip(), 'status': None, 'error': None}
+        results.append(result)
+        try:
+            name, account = parse_row(row)
+        except (ValueError, TypeError) as e:
+            result.update(status='failed', error=str(e))
+            continue
+        if name in seen:
+            result.update(status='failed', error='name appears more than once in the file')
+            continue
+        seen.add(name)
+        if name in children and not replace:
+            result.update(status='skipped', error='account name already exists')
+            continue
+        accepted.append((result, name, account))
+
+    tokens = [account['access_token'] for _, _, account in accepted]
+    encrypted = encryption_manager.encrypt_tokens(tokens)
+
+    connections = {}
+    if connect is not None and accepted:
+        def probe(item):
+            result, name, account = item
+            started = time.perf_counter()
+            try:
+                connection = connect(account['client_id'], account['access_token'])
+                return connection, (time.perf_counter() - started) * 1000, None
+            except Exception as e:
+                return None, (time.perf_counter() - started) * 1000, e
+
+        with ThreadPoolExecutor(max_workers=min(len(accepted), workers), thread_name_prefix='account-import') as executor:
+            probes = list(executor.map(probe, accepted))
+    else:
+        probes = [(None, None, None)] * len(accepted)
+
+    for (result, name, account), token, (connection, latency_ms, error) in zip(accepted, encrypted, probes):
+        result['latency_ms'] = latency_ms
+        if error is not None:
+            result.update(status='failed', error=f"connection test failed: {error}")
+            continue
+        result['status'] = 'updated' if name in children else 'added'
+        children[name] = dict(account, access_token=token)
+        if connection is not None and account['enabled'] == 'Y':
+            connections[name] = connection
+
+    logging.info(f"Imported child accounts: {count_statuses(results)}")
+    return results, connections
@@ -0,0 +1,257 @@
+import csv
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    client_id TEXT,
+    trade_id TEXT,
+    role TEXT,
+    order_id TEXT,
+    side TEXT,
+    security_id TEXT,
+    quantity REAL,
+    price REAL,
+    ts REAL,
+    PRIMARY KEY (client_id, trade_id)
+);
+CREATE INDEX IF NOT EXISTS idx_trades_order ON trades(role, order_id);
+"""
+
+# One row per child order leg: what was ordered, the master's fills for the
+# parent order and the child's own fills. Adopted legs also log a PLACED
+# child_create, so they are counted once.
+CHILD_FILLS = """
+WITH master AS (
+    SELECT order_id, side, SUM(quantity * price) / SUM(quantity) AS vwap, MIN(ts) AS first_ts
+    FROM trades WHERE role = 'master' GROUP BY order_id
+), child AS (
+    SELECT client_id, order_id, SUM(quantity * price) / SUM(quantity) AS vwap,
+           SUM(quantity) AS filled, MIN(ts) AS first_ts
+    FROM trades WHERE role = 'child' GROUP BY client_id, order_id
+)
+SELECT e.client_id, e.order_id, e.child_order_id,
+       COALESCE(json_extract(e.payload, '$.quantity'), 0) AS ordered,
+       master.side, master.vwap AS master_vwap, master.first_ts AS master_ts,
+       child.vwap AS child_vwap, COALESCE(child.filled, 0) AS filled, child.first_ts AS child_ts
+FROM order_events e
+JOIN master ON master.order_id = e.order_id
+LEFT JOIN child ON child.client_id = e.client_id AND child.order_id = e.child_order_id
+WHERE e.event = 'child_create' AND e.status = 'PLACED'
+  AND e.ts >= ? AND e.ts < ?
+"""
+
+CSV_COLUMNS = ('client_id', 'order_id', 'child_order_id', 'side', 'ordered', 'filled',
+               'master_vwap', 'child_vwap', 'slippage', 'slippage_bps', 'lag_s')
+
+# Fill lag histogram edges in seconds; percentiles are read off the
+# accumulated histogram so memory stays flat however long the period
+LAG_BINS = np.concatenate(([0.0], np.geomspace(0.01, 3600, 80), [np.inf]))
+
+
+def parse_trade_time(value):
+    """Dhan trade timestamps ('YYYY-MM-DD HH:MM:SS') as epoch seconds"""
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+class CopyAnalytics:
+    """Slippage, fill lag and fill ratio of child orders against their master order
+
+    Trade books are stored next to the order history (same sqlite file), so
+    reports can cover any period; rows are aggregated in fixed-size chunks
+    with numpy rather than loaded at once.
+    """
+
+    def __init__(self, path, chunk_size=10000):
+        self.path = path
+        self.chunk_size = chunk_size
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def ingest(self, accounts, from_date=None, to_date=None):
+        """Fetch trade books for ``{client_id: (role, dhan)}`` concurrently and store them
+
+        Without dates today's trade book is read; with ``from_date``/``to_date``
+        (YYYY-MM-DD) the paged trade history is used instead, and each page
+        is stored as it arrives. Returns ``{client_id: {'trades', 'error'}}``
+        with the number of trades stored and why the fetch stopped early, if
+        it did.
+        """
+        if not accounts:
+            return {}
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        lock = threading.Lock()
+
+        def store(client_id, role, trades, offset):
+            rows = [(str(client_id), str(trade.get('exchangeTradeId') or f"{trade.get('orderId')}-{offset + i}"),
+                     role, str(trade.get('orderId')), trade.get('transactionType'), str(trade.get('securityId')),
+                     float(trade.get('tradedQuantity') or 0), float(trade.get('tradedPrice') or 0),
+                     parse_trade_time(trade.get('exchangeTime') or trade.get('updateTime')))
+                    for i, trade in enumerate(trades)]
+            with lock:
+                conn.executemany('INSERT OR REPLACE INTO trades VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                conn.commit()
+
+        def fetch(item):
+            client_id, (role, dhan) = item
+            stored = 0
+            try:
+                if from_date:
+                    page = 0
+                    while True:
+                        response = dhan.get_trade_history(from_date, to_date or from_date, page)
+                        if response.get('status') != 'success':
+                            raise Exception(f"trade history page {page} failed: {response.get('remarks')}")
+                        batch = response.get('data') or []
+                        if not batch:
+                            break
+                        store(client_id, role, batch, stored)
+                        stored += len(batch)
+                        page += 1
+                else:
+                    response = dhan.get_trade_book()
+                    if response.get('status') != 'success':
+                        raise Exception(response.get('remarks'))
+                    trades = response.get('data') or []
+                    store(client_id, role, trades, 0)
+                    stored = len(trades)
+                return client_id, {'trades': stored, 'error': None}
+            except Exception as e:
+                logging.error(f"Could not fetch trades for {client_id}: {e}")
+                return client_id, {'trades': stored, 'error': str(e)}
+
+        try:
+            with ThreadPoolExecutor(max_workers=min(len(accounts), 16), thread_name_prefix='trade-book') as executor:
+                return dict(executor.map(fetch, accounts.items()))
+        finally:
+            conn.close()
+
+    def _chunks(self, since=None, until=None):
+        """Yield the matched child order rows as dicts of numpy columns"""
+        conn = self._connect()
+        try:
+            cursor = conn.execute(CHILD_FILLS, (since or 0, until or time.time() + 86400))
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                side = np.array([row['side'] for row in rows])
+                master_vwap = np.array([row['master_vwap'] for row in rows], dtype=float)
+                child_vwap = np.array([row['child_vwap'] if row['child_vwap'] is not None else np.nan
+                                       for row in rows], dtype=float)
+                master_ts = np.array([row['master_ts'] if row['master_ts'] is not None else np.nan
+                                      for row in rows], dtype=float)
+                child_ts = np.array([row['child_ts'] if row['child_ts'] is not None else np.nan
+                                     for row in rows], dtype=float)
+                # Positive slippage is always worse for the child
+                direction = np.where(side == 'SELL', -1.0, 1.0)
+                slippage = (child_vwap - master_vwap) * direction
+                yield {
+                    'client_id': np.array([row['client_id'] for row in rows]),
+                    'order_id': [row['order_id'] for row in rows],
+                    'child_order_id': [row['child_order_id'] for row in rows],
+                    'side': side,
+                    'ordered': np.array([row['ordered'] for row in rows], dtype=float),
+                    'filled': np.array([row['filled'] for row in rows], dtype=float),
+                    'master_vwap': master_vwap,
+                    'child_vwap': child_vwap,
+                    'slippage': slippage,
+                    'slippage_bps': slippage / master_vwap * 1e4,
+                    'lag_s': child_ts - master_ts
+                }
+        finally:
+            conn.close()
+
+    def report(self, since=None, until=None):
+        """Per-child aggregates over the period"""
+        totals = {}
+        for chunk in self._chunks(since, until):
+            clients, index = np.unique(chunk['client_id'], return_inverse=True)
+            filled = chunk['filled']
+            has_fill = ~np.isnan(chunk['slippage']) & (filled > 0)
+            weight = np.where(has_fill, filled, 0.0)
+            sums = {
+                'orders': np.bincount(index, minlength=len(clients)),
+                'ordered': np.bincount(index, chunk['ordered'], len(clients)),
+                'filled': np.bincount(index, filled, len(clients)),
+                'slipped_qty': np.bincount(index, weight, len(clients)),
+                'slippage_cost': np.bincount(index, np.where(has_fill, chunk['slippage'] * filled, 0.0), len(clients)),
+                'slippage_bps_qty': np.bincount(index, np.where(has_fill, chunk['slippage_bps'] * filled, 0.0),
+                                                len(clients))
+            }
+            lag = chunk['lag_s']
+            for i, client_id in enumerate(clients):
+                total = totals.setdefault(client_id, {
+                    'orders': 0, 'ordered': 0.0, 'filled': 0.0, 'slipped_qty': 0.0,
+                    'slippage_cost': 0.0, 'slippage_bps_qty': 0.0,
+                    'lag_hist': np.zeros(len(LAG_BINS) - 1), 'lag_sum': 0.0, 'lag_count': 0
+                })
+                for key, values in sums.items():
+                    total[key] += values[i]
+                client_lag = lag[(index == i) & ~np.isnan(lag)]
+                client_lag = np.clip(client_lag, 0, None)
+                total['lag_hist'] += np.histogram(client_lag, LAG_BINS)[0]
+                total['lag_sum'] += client_lag.sum()
+                total['lag_count'] += len(client_lag)
+
+        return {client_id: self._summarize(total) for client_id, total in totals.items()}
+
+    @staticmethod
+    def _summarize(total):
+        def lag_percentile(q):
+            if not total['lag_count']:
+                return None
+            position = np.searchsorted(np.cumsum(total['lag_hist']), q * total['lag_count'])
+            return float(LAG_BINS[min(position + 1, len(LAG_BINS) - 2)])
+
+        return {
+            'orders': int(total['orders']),
+            'ordered': float(total['ordered']),
+            'filled': float(total['filled']),
+            'fill_ratio': float(total['filled'] / total['ordered']) if total['ordered'] else None,
+            'avg_slippage_bps': (float(total['slippage_bps_qty'] / total['slipped_qty'])
+                                 if total['slipped_qty'] else None),
+            'slippage_cost': float(total['slippage_cost']),
+            'avg_lag_s': float(total['lag_sum'] / total['lag_count']) if total['lag_count'] else None,
+            'p50_lag_s': lag_percentile(0.5),
+            'p95_lag_s': lag_percentile(0.95)
+        }
+
+    def export_csv(self, since=None, until=None):
+        """Yield the per-order rows as CSV text, one chunk at a time"""
+        class Buffer:
+            def __init__(self):
+                self.parts = []
+
+            def write(self, text):
+                self.parts.append(text)
+
+        buffer = Buffer()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        for chunk in self._chunks(since, until):
+            for i in range(len(chunk['order_id'])):
+                writer.writerow([
+                    chunk[column][i] if not isinstance(chunk[column][i], float) or not np.isnan(chunk[column][i])
+                    else '' for column in CSV_COLUMNS
+                ])
+            yield ''.join(buffer.parts)
+            buffer.parts = []
+        if buffer.parts:
+            yield ''.join(buffer.parts)
@@ -0,0 +1,183 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+DHAN_API_URL = 'https://api.dhan.co/v2'
+
+
+class AsyncDhanClient:
+    """asyncio client for the Dhan endpoints used by the copy engine
+
+    Mirrors the dhanhq method names, arguments and ``{'status', 'remarks',
+    'data'}`` responses so it can stand in for a dhanhq connection.
+    """
+
+    def __init__(self, client_id, access_token, broker):
+        self.client_id = str(client_id)
+        self.broker = broker
+        self.header = {
+            'access-token': access_token,
+            'client-id': self.client_id,
+            'Content-type': 'application/json',
+            'Accept': 'application/json'
+        }
+
+    async def _request(self, method, path, payload=None):
+        """Send a request on the shared session and shape the reply like dhanhq"""
+        try:
+            async with self.broker.session.request(
+                method,
+                self.broker.base_url + path,
+                headers=self.header,
+                data=json.dumps(payload) if payload is not None else None
+            ) as response:
+                body = await response.json(content_type=None)
+                if response.status == 200:
+                    return {'status': 'success', 'remarks': '', 'data': body}
+                return {
+                    'status': 'failure',
+                    'remarks': {
+                        'error_code': body.get('errorCode'),
+                        'error_type': body.get('errorType'),
+                        'error_message': body.get('errorMessage')
+                    },
+                    'data': body
+                }
+        except Exception as e:
+            logging.error(f"Exception in AsyncDhanClient {method} {path}: {e}")
+            return {'status': 'failure', 'remarks': str(e), 'data': ''}
+
+    async def place_order(self, security_id, exchange_segment, transaction_type, quantity,
+                          order_type, product_type, price, trigger_price=0, disclosed_quantity=0,
+                          after_market_order=False, validity='DAY', tag=None):
+        payload = {
+            'dhanClientId': self.client_id,
+            'transactionType': transaction_type.upper(),
+            'exchangeSegment': exchange_segment.upper(),
+            'productType': product_type.upper(),
+            'orderType': order_type.upper(),
+            'validity': validity.upper(),
+            'securityId': security_id,
+            'quantity': int(quantity),
+            'disclosedQuantity': int(disclosed_quantity),
+            'price': float(price),
+            'triggerPrice': float(trigger_price),
+            'afterMarketOrder': after_market_order
+        }
+        if tag:
+            payload['correlationId'] = tag
+        return await self._request('POST', '/orders', payload)
+
+    async def modify_order(self, order_id, order_type, leg_name, quantity, price,
+                           trigger_price, disclosed_quantity, validity):
+        payload = {
+            'dhanClientId': self.client_id,
+            'orderId': str(order_id),
+            'orderType': order_type,
+            'legName': leg_name,
+            'quantity': quantity,
+            'price': price,
+            'disclosedQuantity': disclosed_quantity,
+            'triggerPrice': trigger_price,
+            'validity': validity
+        }
+        return await self._request('PUT', f'/orders/{order_id}', payload)
+
+    async def cancel_order(self, order_id):
+        return await self._request('DELETE', f'/orders/{order_id}')
+
+    async def get_fund_limits(self):
+        return await self._request('GET', '/fundlimit')
+
+    async def get_order_list(self):
+        return await self._request('GET', '/orders')
+
+    async def get_positions(self):
+        return await self._request('GET', '/positions')
+
+
+class BlockingDhanClient:
+    """Synchronous view of an AsyncDhanClient for callers outside the event loop"""
+
+    def __init__(self, aio, broker):
+        self.aio = aio
+        self.broker = broker
+        self.client_id = aio.client_id
+
+    def __getattr__(self, name):
+        method = getattr(self.aio, name)
+
+        def call(*args, **kwargs):
+            return self.broker.run(method(*args, **kwargs))
+        return call
+
+
+class AsyncBroker:
+    """One event loop thread and one HTTP connection pool shared by every account"""
+
+    def __init__(self, base_url=DHAN_API_URL, pool_size=100, timeout=10):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.loop = None
+        self.session = None
+        self._thread = None
+
+    def start(self):
+        """Start the event loop thread and open the shared session"""
+        try:
+            import aiohttp
+        except ImportError:
+            raise Exception("The async broker backend needs aiohttp: pip install aiohttp")
+
+        if self._thread is not None:
+            return
+
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='async-broker')
+        self._thread.daemon = True
+        self._thread.start()
+
+        async def open_session():
+            return aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        self.session = self.run(open_session())
+        logging.info(f"Async broker started with a pool of {self.pool_size} connections")
+
+    def stop(self):
+        """Close the session and stop the event loop thread"""
+        if self._thread is None:
+            return
+        self.run(self.session.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def client(self, client_id, access_token):
+        """Return a blocking client for one account backed by the shared pool"""
+        return BlockingDhanClient(AsyncDhanClient(client_id, access_token, self), self)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the broker loop and wait for its result"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def gather_timed(self, calls):
+        """Run ``(aio_client, method, kwargs)`` calls concurrently
+
+        Returns ``(response, latency_ms, error)`` per call, in call order.
+        """
+        async def timed(aio, method, kwargs):
+            started = time.perf_counter()
+            try:
+                response = await getattr(aio, method)(**kwargs)
+                return response, (time.perf_counter() - started) * 1000, None
+            except Exception as e:
+                return None, (time.perf_counter() - started) * 1000, e
+
+        async def run_all():
+            return await asyncio.gather(*(timed(*call) for call in calls))
+        return self.run(run_all())
@@ -0,0 +1,131 @@
+import threading
+import time
+
+# Dhan error codes that point at the account or the API rather than the order
+# itself (auth, access, rate limit, server and network errors)
+ACCOUNT_ERROR_CODES = {'DH-901', 'DH-902', 'DH-903', 'DH-904', 'DH-908', 'DH-909', 'DH-910'}
+
+
+def is_account_failure(response, error):
+    """Tell whether a broker call failed because of the account or API, not the order"""
+    if error is not None:
+        return True
+    if not isinstance(response, dict) or response.get('status') == 'success':
+        return False
+    remarks = response.get('remarks')
+    if isinstance(remarks, dict):
+        return remarks.get('error_code') in ACCOUNT_ERROR_CODES
+    # dhanhq puts the exception text in remarks when the request never completed
+    return True
+
+
+class CircuitBreaker:
+    """Stops sending orders to an account that keeps failing or answering slowly
+
+    Closed: calls flow normally. Open: calls are skipped until
+    ``reset_timeout`` has passed. Half open: a single probe decides whether
+    to close again or stay open for another timeout.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, client_id, failure_threshold=3, latency_threshold_ms=3000,
+                 slow_threshold=3, reset_timeout=30):
+        self.client_id = client_id
+        self.failure_threshold = failure_threshold
+        self.latency_threshold_ms = latency_threshold_ms
+        self.slow_threshold = slow_threshold
+        self.reset_timeout = reset_timeout
+
+        self.state = self.CLOSED
+        self.opened_at = None
+        self.consecutive_failures = 0
+        self.consecutive_slow = 0
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.success_rate = 1.0
+        self.latency_ms = None
+        self.last_error = None
+        self.dirty = True
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Tell whether regular traffic may be sent to the account"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            self.skipped += 1
+            self.dirty = True
+            return False
+
+    def probe_due(self):
+        """Move an open breaker to half open once its timeout has passed"""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.dirty = True
+                return True
+            return False
+
+    def record(self, latency_ms, failed, error=None):
+        """Feed the outcome of one call into the breaker"""
+        with self._lock:
+            self.latency_ms = latency_ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * latency_ms
+            self.success_rate = 0.8 * self.success_rate + (0.0 if failed else 0.2)
+            slow = latency_ms > self.latency_threshold_ms
+
+            if failed:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = str(error) if error else 'call failed'
+            else:
+                self.successes += 1
+                self.consecutive_failures = 0
+            self.consecutive_slow = self.consecutive_slow + 1 if slow else 0
+
+            if self.state == self.HALF_OPEN:
+                if failed or slow:
+                    self._trip('probe failed' if failed else f"probe took {latency_ms:.0f} ms")
+                else:
+                    self.state = self.CLOSED
+                    self.opened_at = None
+            elif self.state == self.CLOSED:
+                if self.consecutive_failures >= self.failure_threshold:
+                    self._trip(f"{self.consecutive_failures} consecutive failures")
+                elif self.consecutive_slow >= self.slow_threshold:
+                    self._trip(f"{self.consecutive_slow} consecutive calls over {self.latency_threshold_ms} ms")
+            self.dirty = True
+
+    def _trip(self, reason):
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.last_error = reason
+
+    def health_score(self):
+        """Score from 0 (unusable) to 100 combining state, success rate and latency"""
+        if self.state == self.OPEN:
+            return 0
+        score = 100 * self.success_rate
+        if self.latency_ms:
+            score *= min(1.0, self.latency_threshold_ms / (2 * self.latency_ms) + 0.5)
+        if self.state == self.HALF_OPEN:
+            score = min(score, 50)
+        return int(round(score))
+
+    def snapshot(self):
+        """Return the breaker state as a plain dict"""
+        with self._lock:
+            self.dirty = False
+            return {
+                'client_id': self.client_id,
+                'state': self.state,
+                'score': self.health_score(),
+                'successes': self.successes,
+                'failures': self.failures,
+                'skipped': self.skipped,
+                'latency_ms': self.latency_ms,
+                'last_error': self.last_error
+            }
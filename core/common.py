@@ -0,0 +1,64 @@
+import json
+import os
+import tempfile
+
+# Child sizing modes: master quantity times multiplier, scaled by the child's
+# available capital relative to the master, a fixed quantity, or multiplier
+# sizing capped at a notional value
+SIZING_MODES = ('multiplier', 'capital', 'fixed', 'notional')
+
+
+def child_problems(child):
+    """What is wrong with one CHILD config entry, as a list of messages"""
+    problems = []
+    if child.get('enabled') not in ('Y', 'N'):
+        problems.append("enabled must be 'Y' or 'N'")
+    try:
+        if float(child.get('multiplier')) <= 0:
+            problems.append('multiplier must be positive')
+    except (TypeError, ValueError):
+        problems.append('multiplier must be a number')
+
+    sizing = child.get('sizing', 'multiplier')
+    if sizing not in SIZING_MODES:
+        problems.append(f"sizing must be one of {', '.join(SIZING_MODES)}")
+    elif sizing == 'fixed' and not child.get('fixed_quantity'):
+        problems.append('fixed sizing needs fixed_quantity')
+    elif sizing == 'notional' and not child.get('max_notional'):
+        problems.append('notional sizing needs max_notional')
+    return problems
+
+
+def broker_data(response):
+    """Return the data of a dhanhq response, raising if the call failed"""
+    if response.get('status') != 'success':
+        raise Exception(f"Broker call failed: {response.get('remarks')}")
+    return response['data']
+
+
+def count_statuses(results):
+    """Number of results per ``status``"""
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return counts
+
+
+def write_config_atomic(path, config):
+    """Write the config to a temporary file next to ``path`` and rename it into place
+
+    Readers see either the old or the new file, never a half-written one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.config-', suffix='.json', dir=directory)
+    try:
+        if os.path.exists(path):
+            os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(config, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
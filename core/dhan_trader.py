@@ -1,8 +1,16 @@
 import json
 import logging
 import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from dhanhq import dhanhq
 from .encryption import EncryptionManager
+from .account_import import connect_account, import_accounts
+from .common import broker_data, write_config_atomic
+from .event_store import COPY_HALTED
+from .order_slicer import FreezeTable
+
+# Dhan order statuses that can still be cancelled
+OPEN_ORDER_STATUSES = ('PENDING', 'TRANSIT', 'PART_TRADED')
 
 class DhanTrader:
     """Refactored Dhan trading logic for web application"""
@@ -41,8 +49,7 @@ class DhanTrader:
     
     def save_config(self):
         """Save configuration to config.json"""
-        with open('config.json', 'w') as f:
-            json.dump(self.config, f, indent=2)
+        write_config_atomic('config.json', self.config)
     
     def create_dhan_connection(self, client_id, encrypted_token):
         """Create a Dhan API connection"""
@@ -139,6 +146,15 @@ class DhanTrader:
         
         return margins
     
+    def trade_book_accounts(self):
+        """Connected accounts as {client_id: (role, dhan)} for trade book analytics"""
+        accounts = {}
+        if self.master_connection:
+            accounts[self.config.get('MASTER', {}).get('client_id', 'MASTER')] = ('master', self.master_connection)
+        for child_info in self.child_connections.values():
+            accounts[child_info['client_id']] = ('child', child_info['connection'])
+        return accounts
+    
     def start_trading(self):
         """Start the trading system"""
         if self.is_initialized:
@@ -152,6 +168,109 @@ class DhanTrader:
         self.is_active = False
         logging.info("Trading system stopped")
     
+    def kill_switch(self, event_store, timeout=15):
+        """Stop copying, then cancel open orders and square off positions on every child
+
+        Accounts are flattened concurrently. Returns per-account timings and
+        results; accounts that failed a call or did not finish within
+        ``timeout`` seconds are listed as stragglers.
+        """
+        started = time.perf_counter()
+        # Halt the engine first so it cannot copy anything new while we flatten
+        event_store.set_control(COPY_HALTED, True)
+        self.stop_trading()
+        logging.warning("Kill switch engaged")
+        
+        freeze_table = FreezeTable.load(self.config.get('FREEZE_LIMITS'))
+        children = list(self.child_connections.items())
+        results = {}
+        if children:
+            executor = ThreadPoolExecutor(max_workers=len(children), thread_name_prefix='kill-switch')
+            futures = {
+                executor.submit(self.flatten_account, info, freeze_table, event_store): name
+                for name, info in children
+            }
+            done, not_done = wait(futures, timeout=timeout)
+            for future in done:
+                results[futures[future]] = future.result()
+            for future in not_done:
+                name = futures[future]
+                results[name] = {'client_id': self.child_connections[name]['client_id'],
+                                 'done': False, 'elapsed_ms': None,
+                                 'errors': [f"not finished after {timeout}s"]}
+            executor.shutdown(wait=False)
+        
+        report = {
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+            'accounts': results,
+            'stragglers': sorted(name for name, result in results.items()
+                                 if not result['done'] or result['errors'])
+        }
+        logging.warning(f"Kill switch finished in {report['elapsed_ms']:.0f} ms, "
+                        f"stragglers: {report['stragglers']}")
+        return report
+    
+    def flatten_account(self, child_info, freeze_table, event_store):
+        """Cancel every open order and square off every open position of one account"""
+        started = time.perf_counter()
+        dhan = child_info['connection']
+        client_id = child_info['client_id']
+        result = {'client_id': client_id, 'cancelled': 0, 'squared_off': 0, 'errors': [], 'done': False}
+        
+        def record(child_order_id, status, message=None, payload=None):
+            event_store.record('kill_switch', client_id=client_id, child_order_id=child_order_id,
+                               status=status, message=message, payload=payload)
+        
+        # Cancel first so a resting exit order cannot fill on top of the square-off
+        try:
+            orders = broker_data(dhan.get_order_list())
+            for order in orders or []:
+                if order.get('orderStatus') not in OPEN_ORDER_STATUSES:
+                    continue
+                try:
+                    broker_data(dhan.cancel_order(order['orderId']))
+                    result['cancelled'] += 1
+                    record(order['orderId'], 'CANCELLED')
+                except Exception as e:
+                    result['errors'].append(f"cancel {order['orderId']}: {e}")
+                    record(order['orderId'], 'FAILED', str(e))
+        except Exception as e:
+            result['errors'].append(f"order list: {e}")
+        
+        try:
+            positions = broker_data(dhan.get_positions())
+            for position in positions or []:
+                net_qty = int(position.get('netQty') or 0)
+                if net_qty == 0:
+                    continue
+                security_id = str(position['securityId'])
+                for quantity in freeze_table.slice(security_id, abs(net_qty)):
+                    payload = {'security_id': security_id, 'net_qty': net_qty, 'quantity': quantity}
+                    try:
+                        response = broker_data(dhan.place_order(
+                            security_id=security_id,
+                            exchange_segment=position['exchangeSegment'],
+                            transaction_type=dhanhq.SELL if net_qty > 0 else dhanhq.BUY,
+                            quantity=quantity,
+                            order_type=dhanhq.MARKET,
+                            product_type=position['productType'],
+                            price=0
+                        ))
+                        result['squared_off'] += 1
+                        record(response.get('orderId'), 'SQUARED_OFF', payload=payload)
+                    except Exception as e:
+                        result['errors'].append(f"square off {security_id}: {e}")
+                        record(None, 'FAILED', str(e), payload)
+        except Exception as e:
+            result['errors'].append(f"positions: {e}")
+        
+        result['done'] = True
+        result['elapsed_ms'] = (time.perf_counter() - started) * 1000
+        logging.warning(f"Kill switch {client_id}: cancelled {result['cancelled']}, "
+                        f"squared off {result['squared_off']}, {len(result['errors'])} errors "
+                        f"in {result['elapsed_ms']:.0f} ms")
+        return result
+    
     def add_child_account(self, name, client_id, encrypted_token, multiplier=1.0, enabled='Y'):
         """Add a new child account"""
         try:
@@ -183,6 +302,37 @@ class DhanTrader:
             logging.error(f"Failed to add child account {name}: {e}")
             raise
     
+    def import_child_accounts(self, rows, replace=False, validate=True):
+        """Add many child accounts from CSV rows, writing the config once
+
+        See ``import_accounts`` for the per-row results.
+        """
+        results, connections = import_accounts(self.config, rows, self.encryption_manager,
+                                               connect=connect_account if validate else None,
+                                               replace=replace)
+        if any(result['status'] in ('added', 'updated') for result in results):
+            self.save_config()
+        for result in results:
+            name = result['name']
+            if result['status'] not in ('added', 'updated'):
+                continue
+            if name in connections:
+                child_config = self.config['CHILD'][name]
+                self.child_connections[name] = {
+                    'connection': connections[name],
+                    'client_id': child_config['client_id'],
+                    'multiplier': child_config['multiplier']
+                }
+                if name not in self.connected_children:
+                    self.connected_children.append(name)
+            else:
+                # Replaced by a disabled or untested account; the old session
+                # belongs to the credentials that were just overwritten
+                self.child_connections.pop(name, None)
+                if name in self.connected_children:
+                    self.connected_children.remove(name)
+        return results
+    
     def remove_child_account(self, name):
         """Remove a child account"""
         try:
@@ -19,6 +19,11 @@ class EncryptionManager:
             token = token.encode()
         return self.fernet.encrypt(token).decode()
     
+    def encrypt_tokens(self, tokens):
+        """Encrypt many tokens with the one loaded key"""
+        return [self.fernet.encrypt(token.encode() if isinstance(token, str) else token).decode()
+                for token in tokens]
+    
     def decrypt_token(self, encrypted_token):
         """Decrypt a token"""
         if isinstance(encrypted_token, str):
@@ -0,0 +1,185 @@
+import logging
+import threading
+import time
+from datetime import datetime
+
+# Order status lattice: an order only ever moves up. Statuses not listed are
+# treated as live (rank 1), which covers the broker's various *PENDING states.
+STATUS_RANK = {
+    'TRANSIT': 0,
+    'PUT ORDER REQ RECEIVED': 0,
+    'VALIDATION PENDING': 0,
+    'OPEN PENDING': 0,
+    'PENDING': 1,
+    'OPEN': 1,
+    'TRIGGER PENDING': 1,
+    'PART_TRADED': 1,
+    'COMPLETE': 2,
+    'TRADED': 2,
+    'CANCELLED': 2,
+    'REJECTED': 2,
+    'EXPIRED': 2
+}
+LIVE_RANK = 1
+TERMINAL_RANK = 2
+
+# Broker update time fields, most precise first
+TIMESTAMP_FIELDS = ('exchange_update_timestamp', 'order_timestamp', 'updateTime', 'update_time')
+
+# Cumulative filled quantity fields, as named by the different update feeds
+FILLED_FIELDS = ('filled_quantity', 'filledQty', 'tradedQuantity')
+
+# Fields that make two updates of the same order different, besides the fill
+FINGERPRINT_FIELDS = ('order_status', 'quantity', 'price', 'trigger_price', 'order_type', 'validity')
+
+
+def status_rank(status):
+    """Position of an order status in the lattice"""
+    return STATUS_RANK.get(str(status or '').upper(), LIVE_RANK)
+
+
+def event_timestamp(event):
+    """Broker update time of an event as epoch seconds, or None if it has none"""
+    for field in TIMESTAMP_FIELDS:
+        value = event.get(field)
+        if value in (None, ''):
+            continue
+        if isinstance(value, (int, float)):
+            return float(value)
+        try:
+            return datetime.fromisoformat(str(value)).timestamp()
+        except ValueError:
+            continue
+    return None
+
+
+def filled_quantity(event):
+    """Cumulative filled quantity of an order update"""
+    for field in FILLED_FIELDS:
+        if event.get(field) not in (None, ''):
+            return int(event[field])
+    if event.get('order_status') in ('COMPLETE', 'TRADED'):
+        return int(event.get('quantity', 0))
+    return 0
+
+
+class EventSequencer:
+    """Orders, de-duplicates and filters master order updates per order_id
+
+    Updates are held for ``window_ms`` so a late update can overtake one that
+    arrived early, then replayed in (status rank, broker timestamp, filled
+    quantity, arrival) order. An update is suppressed when it repeats the last accepted update,
+    moves the order back down the status lattice, carries an older broker
+    timestamp or filled quantity, or arrives after the order was closed.
+    """
+
+    def __init__(self, deliver, window_ms=50, on_suppressed=None):
+        self.deliver = deliver
+        self.window = window_ms / 1000
+        self.on_suppressed = on_suppressed
+        self.accepted = 0
+        self.suppressed = {}
+        self._last = {}
+        self._pending = {}
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._deliver_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._flusher = None
+
+    def submit(self, event):
+        """Accept one raw update from the feed"""
+        if self.window <= 0:
+            with self._deliver_lock:
+                self._release([event])
+            return
+
+        with self._lock:
+            self._sequence += 1
+            buffered = self._pending.setdefault(str(event.get('order_id')), [])
+            buffered.append((time.monotonic(), self._sequence, event))
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name='event-sequencer')
+                self._flusher.daemon = True
+                self._flusher.start()
+            self._wakeup.notify()
+
+    def flush(self):
+        """Release every buffered update now, e.g. at the end of a replay"""
+        self._release_due(0)
+
+    def _release_due(self, window):
+        """Deliver the buffers whose oldest update has waited at least ``window`` seconds"""
+        # Popping and delivering under the delivery lock keeps each order's
+        # batches in arrival order even when flush() races the flusher thread
+        with self._deliver_lock:
+            with self._lock:
+                now = time.monotonic()
+                due = [order_id for order_id, batch in self._pending.items()
+                       if now - batch[0][0] >= window]
+                batches = [self._pending.pop(order_id) for order_id in due]
+            for batch in batches:
+                self._release([event for _, _, event in batch])
+
+    def _flush_loop(self):
+        """Release each order's buffer once its oldest update has waited out the window"""
+        while True:
+            with self._lock:
+                while not self._pending:
+                    self._wakeup.wait()
+                oldest = min(batch[0][0] for batch in self._pending.values())
+                delay = oldest + self.window - time.monotonic()
+                if delay > 0:
+                    self._wakeup.wait(delay)
+                    continue
+            self._release_due(self.window)
+
+    def _release(self, events):
+        """Sort one order's updates and deliver those that move it forward"""
+        events = sorted(events, key=lambda event: (status_rank(event.get('order_status')),
+                                                   event_timestamp(event) or 0,
+                                                   filled_quantity(event)))
+        for event in events:
+            reason = self._check(event)
+            if reason is None:
+                self.accepted += 1
+                try:
+                    self.deliver(event)
+                except Exception as e:
+                    logging.error(f"Error processing order update {event.get('order_id')}: {e}")
+            else:
+                self.suppressed[reason] = self.suppressed.get(reason, 0) + 1
+                logging.info(f"Suppressed {reason} update for order {event.get('order_id')} "
+                             f"({sum(self.suppressed.values())} suppressed so far)")
+                if self.on_suppressed is not None:
+                    self.on_suppressed(event, reason)
+
+    def _check(self, event):
+        """Return why an update should be suppressed, or None to deliver it"""
+        order_id = str(event.get('order_id'))
+        state = (
+            status_rank(event.get('order_status')),
+            event_timestamp(event),
+            filled_quantity(event),
+            tuple(event.get(field) for field in FINGERPRINT_FIELDS)
+        )
+        last = self._last.get(order_id)
+        if last is not None:
+            rank, ts, filled, fingerprint = state
+            last_rank, last_ts, last_filled, last_fingerprint = last
+            if fingerprint == last_fingerprint and filled == last_filled and (ts is None or ts == last_ts):
+                return 'duplicate'
+            if last_rank == TERMINAL_RANK:
+                return 'after_close'
+            if rank < last_rank:
+                return 'stale_status'
+            if ts is not None and last_ts is not None and ts < last_ts:
+                return 'stale_timestamp'
+            if filled < last_filled:
+                return 'stale_fill'
+        self._last[order_id] = state
+        return None
+
+    def stats(self):
+        """Accepted and suppressed update counts"""
+        return {'accepted': self.accepted, 'suppressed': dict(self.suppressed)}
@@ -0,0 +1,349 @@
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+DEFAULT_DB_PATH = 'copytrade_events.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS order_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    event TEXT NOT NULL,
+    order_id TEXT,
+    client_id TEXT,
+    child_order_id TEXT,
+    status TEXT,
+    latency_ms REAL,
+    message TEXT,
+    payload TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_order_events_ts ON order_events(ts);
+CREATE INDEX IF NOT EXISTS idx_order_events_order ON order_events(order_id, id);
+CREATE INDEX IF NOT EXISTS idx_order_events_client ON order_events(client_id, id);
+CREATE INDEX IF NOT EXISTS idx_order_events_status ON order_events(status, id);
+CREATE TABLE IF NOT EXISTS account_health (
+    client_id TEXT PRIMARY KEY,
+    state TEXT,
+    score INTEGER,
+    successes INTEGER,
+    failures INTEGER,
+    skipped INTEGER,
+    latency_ms REAL,
+    last_error TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS control (
+    key TEXT PRIMARY KEY,
+    value TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS source_orders (
+    order_id TEXT PRIMARY KEY,
+    data TEXT,
+    updated_at REAL
+);
+CREATE TABLE IF NOT EXISTS order_mapping (
+    order_id TEXT,
+    client_id TEXT,
+    child_order_id TEXT,
+    active INTEGER,
+    updated_at REAL,
+    PRIMARY KEY (order_id, client_id, child_order_id)
+);
+CREATE INDEX IF NOT EXISTS idx_order_mapping_updated ON order_mapping(updated_at);
+CREATE INDEX IF NOT EXISTS idx_source_orders_updated ON source_orders(updated_at);
+CREATE TABLE IF NOT EXISTS child_fills (
+    order_id TEXT,
+    client_id TEXT,
+    quantity INTEGER,
+    updated_at REAL,
+    PRIMARY KEY (order_id, client_id)
+);
+CREATE INDEX IF NOT EXISTS idx_child_fills_updated ON child_fills(updated_at);
+CREATE TABLE IF NOT EXISTS child_sizing (
+    order_id TEXT,
+    client_id TEXT,
+    ratio REAL,
+    updated_at REAL,
+    PRIMARY KEY (order_id, client_id)
+);
+CREATE INDEX IF NOT EXISTS idx_child_sizing_updated ON child_sizing(updated_at);
+"""
+
+EVENT_COLUMNS = ('ts', 'event', 'order_id', 'client_id', 'child_order_id',
+                 'status', 'latency_ms', 'message', 'payload')
+
+INSERT_EVENT = (f"INSERT INTO order_events ({', '.join(EVENT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(EVENT_COLUMNS))})")
+
+HEALTH_COLUMNS = ('client_id', 'state', 'score', 'successes', 'failures',
+                  'skipped', 'latency_ms', 'last_error', 'updated_at')
+
+UPSERT_HEALTH = (f"INSERT OR REPLACE INTO account_health ({', '.join(HEALTH_COLUMNS)}) "
+                 f"VALUES ({', '.join('?' * len(HEALTH_COLUMNS))})")
+
+MAX_PAGE_SIZE = 500
+
+# Replication state is re-read with this much overlap, since rows are stamped
+# when queued and may commit slightly out of order
+STATE_OVERLAP = 1.0
+
+# Control flag set by the kill switch; the engine skips master orders while it is true
+COPY_HALTED = 'copy_halted'
+
+# Control flag set from the dashboard to open a profiling window in the engine
+PROFILE_REQUEST = 'profile_request'
+
+# Latest pre-open session check, written by the engine for the dashboard
+SESSION_REPORT = 'session_report'
+
+
+class EventStore:
+    """SQLite-backed history of master order updates and child order actions
+
+    Writes are queued and committed in batches by a background thread so the
+    copy path never waits on disk. Reads use keyset pagination on the row id,
+    which stays fast no matter how deep the caller pages.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH, batch_size=200, flush_interval=0.2):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._local = threading.local()
+        self._queue = queue.Queue()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+
+    def _connect(self):
+        """Return the sqlite connection owned by the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _ensure_writer(self):
+        """Start the background writer thread on first use"""
+        if self._writer is not None:
+            return
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._writer_loop, name='event-store-writer')
+                self._writer.daemon = True
+                self._writer.start()
+
+    def _writer_loop(self):
+        """Drain the write queue into sqlite in batches"""
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+
+            # Group rows by statement so each batch is a handful of executemany calls
+            statements = {}
+            for sql, params in batch:
+                statements.setdefault(sql, []).append(params)
+            try:
+                conn = self._connect()
+                for sql, rows in statements.items():
+                    conn.executemany(sql, rows)
+                conn.commit()
+            except Exception as e:
+                logging.error(f"Failed to write {len(batch)} history rows: {e}")
+
+            for _ in batch:
+                self._queue.task_done()
+
+    def record(self, event, order_id=None, client_id=None, child_order_id=None,
+               status=None, latency_ms=None, message=None, payload=None, ts=None):
+        """Queue an event for writing"""
+        self._ensure_writer()
+        self._queue.put((INSERT_EVENT, (
+            ts if ts is not None else time.time(),
+            event,
+            str(order_id) if order_id is not None else None,
+            str(client_id) if client_id is not None else None,
+            str(child_order_id) if child_order_id is not None else None,
+            status,
+            latency_ms,
+            message,
+            json.dumps(payload, default=str) if payload is not None else None
+        )))
+
+    def update_health(self, snapshot):
+        """Queue an account health snapshot (see CircuitBreaker.snapshot)"""
+        self._ensure_writer()
+        row = dict(snapshot, updated_at=time.time())
+        self._queue.put((UPSERT_HEALTH, tuple(row.get(column) for column in HEALTH_COLUMNS)))
+
+    def get_health(self):
+        """Return the latest health snapshot of every account, keyed by client_id"""
+        rows = self._connect().execute(
+            f"SELECT {', '.join(HEALTH_COLUMNS)} FROM account_health"
+        ).fetchall()
+        return {row['client_id']: dict(row) for row in rows}
+
+    def set_control(self, key, value):
+        """Write an operator control flag straight away, bypassing the write queue"""
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO control (key, value, updated_at) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), time.time()))
+        conn.commit()
+
+    def get_control(self, key, default=None):
+        """Read an operator control flag"""
+        row = self._connect().execute('SELECT value FROM control WHERE key = ?', (key,)).fetchone()
+        return json.loads(row['value']) if row else default
+
+    def save_source_order(self, order_id, data):
+        """Queue the latest copied state of a master order"""
+        self._ensure_writer()
+        self._queue.put(('INSERT OR REPLACE INTO source_orders (order_id, data, updated_at) VALUES (?, ?, ?)',
+                         (str(order_id), json.dumps(data, default=str), time.time())))
+
+    def save_mapping(self, order_id, client_id, child_order_id):
+        """Queue a new child order leg for a master order"""
+        self._ensure_writer()
+        self._queue.put(('INSERT OR IGNORE INTO order_mapping (order_id, client_id, child_order_id, active, updated_at) '
+                         'VALUES (?, ?, ?, 1, ?)',
+                         (str(order_id), str(client_id), str(child_order_id), time.time())))
+
+    def drop_mapping(self, order_id, client_id, child_order_id):
+        """Queue the removal of a child order leg"""
+        self._ensure_writer()
+        self._queue.put(('UPDATE order_mapping SET active = 0, updated_at = ? '
+                         'WHERE order_id = ? AND client_id = ? AND child_order_id = ?',
+                         (time.time(), str(order_id), str(client_id), str(child_order_id))))
+
+    def save_fill(self, order_id, client_id, quantity):
+        """Queue the quantity a child has been sent for a master order's fills"""
+        self._ensure_writer()
+        self._queue.put(('INSERT OR REPLACE INTO child_fills (order_id, client_id, quantity, updated_at) '
+                         'VALUES (?, ?, ?, ?)',
+                         (str(order_id), str(client_id), int(quantity), time.time())))
+
+    def save_sizing(self, order_id, client_id, ratio):
+        """Queue the capital ratio a child order was sized with"""
+        self._ensure_writer()
+        self._queue.put(('INSERT OR REPLACE INTO child_sizing (order_id, client_id, ratio, updated_at) '
+                         'VALUES (?, ?, ?, ?)',
+                         (str(order_id), str(client_id), float(ratio), time.time())))
+
+    def load_state(self, since=None):
+        """Return copy state changed since a previous call's ``cursor``
+
+        ``mappings`` holds the full list of active legs, in placement order,
+        for every (order_id, client_id) pair that changed.
+        """
+        conn = self._connect()
+        cursor = since or 0
+        since = (since - STATE_OVERLAP) if since is not None else 0
+
+        source_orders = {}
+        for row in conn.execute('SELECT order_id, data, updated_at FROM source_orders WHERE updated_at >= ?',
+                                (since,)):
+            source_orders[row['order_id']] = json.loads(row['data'])
+            cursor = max(cursor, row['updated_at'])
+
+        changed = set()
+        for row in conn.execute('SELECT order_id, client_id, updated_at FROM order_mapping WHERE updated_at >= ?',
+                                (since,)):
+            changed.add((row['order_id'], row['client_id']))
+            cursor = max(cursor, row['updated_at'])
+        mappings = {}
+        for order_id, client_id in changed:
+            rows = conn.execute('SELECT child_order_id FROM order_mapping WHERE order_id = ? AND client_id = ? '
+                                'AND active = 1 ORDER BY rowid', (order_id, client_id)).fetchall()
+            mappings[(order_id, client_id)] = [row['child_order_id'] for row in rows]
+
+        fills = {}
+        for row in conn.execute('SELECT order_id, client_id, quantity, updated_at FROM child_fills '
+                                'WHERE updated_at >= ?', (since,)):
+            fills[(row['order_id'], row['client_id'])] = row['quantity']
+            cursor = max(cursor, row['updated_at'])
+
+        sizing = {}
+        for row in conn.execute('SELECT order_id, client_id, ratio, updated_at FROM child_sizing '
+                                'WHERE updated_at >= ?', (since,)):
+            sizing[(row['order_id'], row['client_id'])] = row['ratio']
+            cursor = max(cursor, row['updated_at'])
+
+        return {'source_orders': source_orders, 'mappings': mappings, 'fills': fills, 'sizing': sizing,
+                'cursor': cursor}
+
+    def flush(self):
+        """Block until every queued event has been written"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def query_events(self, cursor=None, limit=100, order_id=None, client_id=None,
+                     status=None, event=None, since=None, until=None):
+        """Return one page of events, newest first
+
+        ``cursor`` is the ``next_cursor`` from the previous page. The result
+        carries ``next_cursor=None`` once there is nothing older to load.
+        """
+        limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+        clauses = []
+        params = []
+
+        if cursor is not None:
+            clauses.append('id < ?')
+            params.append(int(cursor))
+        if order_id:
+            clauses.append('order_id = ?')
+            params.append(str(order_id))
+        if client_id:
+            clauses.append('client_id = ?')
+            params.append(str(client_id))
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if event:
+            clauses.append('event = ?')
+            params.append(event)
+        if since is not None:
+            clauses.append('ts >= ?')
+            params.append(float(since))
+        if until is not None:
+            clauses.append('ts < ?')
+            params.append(float(until))
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self._connect().execute(
+            f"SELECT id, {', '.join(EVENT_COLUMNS)} FROM order_events {where} "
+            f"ORDER BY id DESC LIMIT ?",
+            params + [limit + 1]
+        ).fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        events = []
+        for row in rows:
+            item = dict(row)
+            if item['payload']:
+                item['payload'] = json.loads(item['payload'])
+            events.append(item)
+
+        return {
+            'events': events,
+            'next_cursor': events[-1]['id'] if has_more else None
+        }
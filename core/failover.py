@@ -0,0 +1,73 @@
+import fcntl
+import hashlib
+import logging
+import os
+import time
+
+DEFAULT_LOCK_PATH = 'copytrade.lock'
+
+
+def order_tag(order_id, client_id):
+    """Correlation id prefix shared by every leg of one child order"""
+    return hashlib.sha1(f"{order_id}|{client_id}".encode()).hexdigest()[:10]
+
+
+def correlation_tag(order_id, client_id, prefix, leg):
+    """Deterministic Dhan correlationId (max 25 chars) for one child order leg
+
+    Legs share the ``order_tag`` of their child order, so a new leader can
+    find every leg of an order, whichever fill it was placed for.
+    """
+    return f"{order_tag(order_id, client_id)}{prefix}.{leg}"
+
+
+class LeaderLock:
+    """Host-local leader election on an exclusive flock
+
+    Only one process can hold the lock; the kernel drops it the moment the
+    holder exits or crashes, so a standby polling ``try_acquire`` takes over
+    within one poll interval.
+    """
+
+    def __init__(self, path=DEFAULT_LOCK_PATH):
+        self.path = path
+        self._fd = None
+
+    def try_acquire(self):
+        """Take the lock if it is free; return whether this process is now leader"""
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, f"{os.getpid()}\n".encode())
+        self._fd = fd
+        return True
+
+    def wait(self, poll_interval=0.2, on_idle=None):
+        """Block until the lock is ours, calling ``on_idle`` between attempts"""
+        while not self.try_acquire():
+            if on_idle is not None:
+                try:
+                    on_idle()
+                except Exception as e:
+                    logging.error(f"Standby refresh failed: {e}")
+            time.sleep(poll_interval)
+
+    def holder(self):
+        """PID written by the current leader, if any"""
+        try:
+            with open(self.path, 'r') as f:
+                return int(f.read().strip() or 0) or None
+        except (OSError, ValueError):
+            return None
+
+    def release(self):
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,141 @@
+import bisect
+import csv
+import logging
+import mmap
+import os
+import struct
+import time
+
+# Dhan exchange segments, indexed by the code stored in each record
+SEGMENTS = ('NSE_EQ', 'NSE_FNO', 'NSE_CURRENCY', 'BSE_EQ', 'BSE_FNO', 'BSE_CURRENCY', 'MCX_COMM', 'IDX_I')
+
+# Scrip-master (exchange id, segment) pairs to Dhan exchange segments
+SCRIP_SEGMENTS = {
+    ('NSE', 'E'): 'NSE_EQ',
+    ('NSE', 'D'): 'NSE_FNO',
+    ('NSE', 'C'): 'NSE_CURRENCY',
+    ('BSE', 'E'): 'BSE_EQ',
+    ('BSE', 'D'): 'BSE_FNO',
+    ('BSE', 'C'): 'BSE_CURRENCY',
+    ('MCX', 'M'): 'MCX_COMM',
+    ('NSE', 'I'): 'IDX_I',
+    ('BSE', 'I'): 'IDX_I'
+}
+
+MAGIC = b'DHIM'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+# key (segment code << 40 | security id), lot size, tick size in paise
+RECORD = struct.Struct('<QII')
+
+
+def record_key(exchange_segment, security_id):
+    """Pack an exchange segment and security id into one sortable integer"""
+    return (SEGMENTS.index(exchange_segment) << 40) | int(security_id)
+
+
+def round_to_lots(quantities, lot_size):
+    """Round scaled quantities down to whole lots in one pass"""
+    lot_size = max(int(lot_size or 1), 1)
+    return [(int(round(quantity)) // lot_size) * lot_size for quantity in quantities]
+
+
+def build(csv_path, out_path):
+    """Compile the broker scrip-master CSV into the binary instrument file
+
+    Reads both the compact (``SEM_*`` columns) and the detailed scrip master.
+    Returns the number of instruments written.
+    """
+    records = {}
+    with open(csv_path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            exchange = row.get('SEM_EXM_EXCH_ID') or row.get('EXCH_ID')
+            segment = SCRIP_SEGMENTS.get((exchange, row.get('SEM_SEGMENT') or row.get('SEGMENT')))
+            security_id = row.get('SEM_SMST_SECURITY_ID') or row.get('SECURITY_ID')
+            if segment is None or not (security_id or '').isdigit():
+                continue
+            lot_size = int(float(row.get('SEM_LOT_UNITS') or row.get('LOT_SIZE') or 1)) or 1
+            tick_size = float(row.get('SEM_TICK_SIZE') or row.get('TICK_SIZE') or 0)
+            records[record_key(segment, security_id)] = (lot_size, int(round(tick_size * 100)))
+
+    tmp_path = f"{out_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        for key in sorted(records):
+            f.write(RECORD.pack(key, *records[key]))
+    os.replace(tmp_path, out_path)
+    return len(records)
+
+
+class _Keys:
+    """Sequence view over the record keys so bisect can search the mapped file"""
+
+    def __init__(self, master):
+        self.master = master
+
+    def __len__(self):
+        return self.master.count
+
+    def __getitem__(self, index):
+        return struct.unpack_from('<Q', self.master.data, HEADER.size + index * RECORD.size)[0]
+
+
+class InstrumentMaster:
+    """Read-only instrument lookup backed by a memory-mapped binary file
+
+    Records are fixed size and sorted by (segment, security id), so opening
+    the file costs one mmap call and each lookup is a binary search over
+    the mapped pages.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.count = 0
+        self.data = None
+        self._file = None
+        if path:
+            self._file = open(path, 'rb')
+            self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.count = HEADER.unpack_from(self.data, 0)
+            if magic != MAGIC or version != VERSION:
+                raise Exception(f"{path} is not an instrument master file")
+        self._keys = _Keys(self)
+
+    @classmethod
+    def load(cls, csv_path):
+        """Open the binary master for a scrip-master CSV, rebuilding it if the CSV is newer"""
+        if not csv_path:
+            return cls()
+        if not os.path.exists(csv_path):
+            raise Exception(f"Instrument master {csv_path} not found")
+
+        bin_path = f"{csv_path}.bin"
+        if not os.path.exists(bin_path) or os.path.getmtime(bin_path) < os.path.getmtime(csv_path):
+            started = time.perf_counter()
+            count = build(csv_path, bin_path)
+            logging.info(f"Built instrument master with {count} instruments in "
+                         f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        return cls(bin_path)
+
+    def get(self, exchange_segment, security_id):
+        """Return (lot_size, tick_size) for an instrument, or None if unknown"""
+        if not self.count or exchange_segment not in SEGMENTS or not str(security_id).isdigit():
+            return None
+        key = record_key(exchange_segment, security_id)
+        index = bisect.bisect_left(self._keys, key)
+        if index == self.count or self._keys[index] != key:
+            return None
+        _, lot_size, tick_paise = RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+        return lot_size, tick_paise / 100
+
+    def lot_size(self, exchange_segment, security_id):
+        """Return the lot size of an instrument, or None if unknown"""
+        record = self.get(exchange_segment, security_id)
+        return record[0] if record else None
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self._file.close()
+            self.data = None
+            self.count = 0
@@ -0,0 +1,318 @@
+import bz2
+import glob
+import gzip
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_LOG_PATH = 'logcopytrade.log'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS log_segments (
+    signature TEXT PRIMARY KEY,
+    path TEXT,
+    offset INTEGER,
+    complete INTEGER,
+    indexed_at REAL
+);
+CREATE TABLE IF NOT EXISTS log_events (
+    signature TEXT,
+    offset INTEGER,
+    ts REAL,
+    pid INTEGER,
+    level TEXT,
+    kind TEXT,
+    order_id TEXT,
+    client_id TEXT,
+    child_order_id TEXT,
+    latency_ms REAL,
+    error_class TEXT,
+    message TEXT,
+    PRIMARY KEY (signature, offset)
+);
+CREATE INDEX IF NOT EXISTS idx_log_events_ts ON log_events(ts);
+CREATE INDEX IF NOT EXISTS idx_log_events_order ON log_events(order_id, ts);
+CREATE INDEX IF NOT EXISTS idx_log_events_child ON log_events(child_order_id);
+"""
+
+# '%(asctime)s-%(process)d-%(levelname)s-%(message)s' from setup_logging
+RECORD_START = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),(\d{3})-(\d+)-([A-Z]+)-')
+
+# Rotated segments next to the live log: .1, .2.gz, -20261018.bz2, ...
+ROTATED_SUFFIX = re.compile(r'^(\.\d+|[.-]\d{8}(-\d+)?)?(\.gz|\.bz2)?$')
+
+# (kind, pattern) tried in order against the first line of each message;
+# named groups become columns. Result lines written before the parent order
+# id and latency were added to them still match, with those fields empty.
+PATTERNS = [
+    ('alert', re.compile(r"^Order alert received: .*?'order_id': '?(?P<order_id>[\w-]+)")),
+    ('creating', re.compile(r'^Creating order (?P<order_id>\S+) for (?P<client_id>\S+)')),
+    ('updating', re.compile(r'^Updating order (?P<order_id>\S+) for (?P<client_id>\S+)')),
+    ('cancelling', re.compile(r'^Cancelling order (?P<order_id>\S+) for (?P<client_id>\S+)')),
+    ('created', re.compile(r'^Created order (?P<client_id>\S+) - (?P<child_order_id>\S+)'
+                           r'(?: for (?P<order_id>\S+) in (?P<latency_ms>[\d.]+) ms)?')),
+    ('updated', re.compile(r'^Updated order (?P<client_id>\S+) - (?P<child_order_id>\S+)'
+                           r'(?: for (?P<order_id>\S+) in (?P<latency_ms>[\d.]+) ms)?')),
+    ('cancelled', re.compile(r'^Cancelled order (?P<client_id>\S+) - (?P<child_order_id>\S+)'
+                             r'(?: for (?P<order_id>\S+) in (?P<latency_ms>[\d.]+) ms)?')),
+    ('processed', re.compile(r'^Processed order (?P<order_id>\S+) in (?P<latency_ms>[\d.]+) ms')),
+    ('halted', re.compile(r'^Copying halted by kill switch, order (?P<order_id>\S+)'
+                          r'(?: not reconciled on (?P<client_id>\S+))?')),
+    ('queued', re.compile(r'^Queued order (?P<order_id>\S+) for reconciliation on (?P<client_id>\S+)')),
+    ('error', re.compile(r'^Target order not found for (?P<order_id>\S+) - (?P<client_id>\S+)')),
+    # Account-level failures name the client id only
+    ('error', re.compile(r'^Failed to connect to (?:Dhan for )?(?P<client_id>[^\s:]+): ')),
+    ('error', re.compile(r'^(?:Failed to fetch|Error fetching) margins for (?P<client_id>[^\s:]+): ')),
+    ('error', re.compile(r'^Could not read order book of (?P<client_id>\S+) on takeover: ')),
+    ('error', re.compile(r'^Could not fetch trades for (?P<client_id>[^\s:]+): ')),
+    ('error', re.compile(r'^Breaker monitor error for (?P<client_id>\S+) ')),
+    ('error', re.compile(r'^Session (?P<client_id>\S+) will fail: ')),
+    ('error', re.compile(r' for (?P<order_id>\S+?)(?: on (?P<client_id>\S+?))?: ')),
+]
+
+# Kinds whose latency is a child broker call
+RESULT_KINDS = ('created', 'updated', 'cancelled')
+
+ERROR_IDS = re.compile(r' for \S+?(?: on \S+?)?(?=: )')
+NUMBER = re.compile(r'(?<![A-Z]-)\b\d+(?:\.\d+)?\b')
+MAX_MESSAGE = 500
+
+
+def error_class(message, ids=()):
+    """Group error messages that differ only in ids, amounts and stack traces"""
+    head = ERROR_IDS.sub('', message.split('\n', 1)[0].split(' - Traceback', 1)[0])
+    for value in ids:
+        head = head.replace(value, '#')
+    return NUMBER.sub('#', head).rstrip(' -')[:160]
+
+
+def parse_message(level, message):
+    """Classify one log message, returning its column values or None to skip it"""
+    first_line = message.split('\n', 1)[0]
+    fields = {'kind': None, 'order_id': None, 'client_id': None, 'child_order_id': None, 'latency_ms': None}
+    for kind, pattern in PATTERNS:
+        if kind == 'error' and level not in ('ERROR', 'CRITICAL'):
+            continue
+        match = pattern.search(first_line)
+        if match:
+            fields.update((key, value) for key, value in match.groupdict().items() if value is not None)
+            fields['kind'] = kind
+            break
+    if level in ('ERROR', 'CRITICAL'):
+        fields['kind'] = 'error'
+    elif fields['kind'] is None:
+        if level != 'WARNING':
+            return None
+        fields['kind'] = 'warning'
+    if fields['latency_ms'] is not None:
+        fields['latency_ms'] = float(fields['latency_ms'])
+    fields['error_class'] = (error_class(message, [fields[key] for key in ('order_id', 'client_id') if fields[key]])
+                             if fields['kind'] == 'error' else None)
+    return fields
+
+
+def open_segment(path):
+    """Open a log segment for binary reading, decompressing .gz and .bz2"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rb')
+    return open(path, 'rb')
+
+
+def segment_signature(path):
+    """Identify a segment by its first complete line, which survives rotation and compression"""
+    try:
+        with open_segment(path) as f:
+            first = f.readline(4096)
+    except (OSError, EOFError):
+        return None
+    if not first.endswith(b'\n'):
+        return None
+    return hashlib.sha1(first).hexdigest()
+
+
+def find_segments(log_path):
+    """The live log and its rotated segments, oldest first"""
+    base = os.path.basename(log_path)
+    segments = [path for path in glob.glob(f"{glob.escape(log_path)}*")
+                if os.path.isfile(path) and ROTATED_SUFFIX.match(os.path.basename(path)[len(base):])]
+    return sorted(segments, key=lambda path: (path == log_path, os.path.getmtime(path)))
+
+
+def iter_records(f, offset, final):
+    """Yield (offset, header match, message) for each log record from ``offset``
+
+    Continuation lines (stack traces, multi-line reprs) are folded into their
+    record. The logging handler writes a record and its newline in one go,
+    so the last record of a live segment is only held back while it lacks
+    the newline, unless ``final`` is set. Finally the resume offset is
+    yielded with a None header.
+    """
+    f.seek(offset)
+    start = offset
+    header = None
+    lines = []
+    position = offset
+    for line in f:
+        match = RECORD_START.match(line)
+        if match:
+            if header is not None:
+                yield start, header, b''.join(lines)
+            start, header, lines = position, match, [line[match.end():]]
+        elif header is not None:
+            lines.append(line)
+        position += len(line)
+        if header is None:
+            start = position
+    if header is not None and (final or lines[-1].endswith(b'\n')):
+        yield start, header, b''.join(lines)
+        start = position
+    yield start, None, None
+
+
+class LogAnalyzer:
+    """Incremental index over the copy engine log and its rotated segments
+
+    Each segment is read once, streaming record by record, and only the
+    lines that matter for post-mortems (order results, latencies, errors)
+    are kept in a small sqlite index next to the log. Later runs resume
+    from the stored offset, so queries over the same day never rescan.
+    """
+
+    def __init__(self, log_path=DEFAULT_LOG_PATH, index_path=None, batch_size=5000):
+        self.log_path = log_path
+        self.index_path = index_path or f"{log_path}.index.db"
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(self.index_path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def update(self):
+        """Index whatever was appended or rotated since the last run; return new event count"""
+        added = 0
+        for path in find_segments(self.log_path):
+            signature = segment_signature(path)
+            if signature is None:
+                continue
+            row = self._conn.execute('SELECT offset, complete FROM log_segments WHERE signature = ?',
+                                     (signature,)).fetchone()
+            if row is not None and row['complete']:
+                continue
+            added += self._index_segment(path, signature, row['offset'] if row else 0,
+                                         final=os.path.abspath(path) != os.path.abspath(self.log_path))
+        return added
+
+    def _index_segment(self, path, signature, offset, final):
+        """Stream one segment from ``offset``, committing events and offset together"""
+        added = 0
+        batch = []
+
+        def commit(resume_offset, complete=False):
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO log_events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', batch
+            )
+            self._conn.execute('INSERT OR REPLACE INTO log_segments VALUES (?, ?, ?, ?, ?)',
+                               (signature, path, resume_offset, int(complete), time.time()))
+            self._conn.commit()
+            batch.clear()
+
+        with open_segment(path) as f:
+            for record_offset, header, body in iter_records(f, offset, final):
+                if header is None:
+                    commit(record_offset, complete=final)
+                    break
+                level = header.group(4).decode()
+                message = body.decode('utf-8', errors='replace').rstrip('\n')
+                fields = parse_message(level, message)
+                if fields is None:
+                    continue
+                ts = datetime.strptime(header.group(1).decode(), '%Y-%m-%d %H:%M:%S').timestamp() \
+                    + int(header.group(2)) / 1000
+                batch.append((signature, record_offset, ts, int(header.group(3)), level, fields['kind'],
+                              fields['order_id'], fields['client_id'], fields['child_order_id'],
+                              fields['latency_ms'], fields['error_class'], message[:MAX_MESSAGE]))
+                added += 1
+                if len(batch) >= self.batch_size:
+                    # Resume at this record; INSERT OR IGNORE skips it on the next run
+                    commit(record_offset)
+        return added
+
+    @staticmethod
+    def _period(day):
+        """Epoch bounds of a YYYY-MM-DD local day, or everything"""
+        if not day:
+            return 0, float('inf')
+        start = datetime.strptime(day, '%Y-%m-%d')
+        return start.timestamp(), (start + timedelta(days=1)).timestamp()
+
+    def _percentiles(self, query, params, quantiles=(0.5, 0.95)):
+        """Percentiles of a single-column query, picked in sqlite without loading the rows"""
+        count = self._conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+        if not count:
+            return [None] * len(quantiles)
+        return [self._conn.execute(f"SELECT * FROM ({query}) ORDER BY 1 LIMIT 1 OFFSET ?",
+                                   (*params, min(count - 1, int(count * q)))).fetchone()[0]
+                for q in quantiles]
+
+    def summary(self, day=None, client_id=None):
+        """Per-child result counts, broker latency, copy lag and error classes"""
+        start, end = self._period(day)
+        client_filter = ' AND client_id = ?' if client_id else ''
+        params = (start, end, client_id) if client_id else (start, end)
+        children = {}
+        for row in self._conn.execute(
+            f"""SELECT client_id,
+                       SUM(kind = 'created') AS created, SUM(kind = 'updated') AS updated,
+                       SUM(kind = 'cancelled') AS cancelled, SUM(kind = 'error') AS failures,
+                       AVG(CASE WHEN kind IN {RESULT_KINDS} THEN latency_ms END) AS avg_latency_ms,
+                       MAX(CASE WHEN kind IN {RESULT_KINDS} THEN latency_ms END) AS max_latency_ms
+                FROM log_events WHERE ts >= ? AND ts < ? AND client_id IS NOT NULL{client_filter}
+                GROUP BY client_id""", params
+        ):
+            stats = dict(row)
+            client = stats.pop('client_id')
+            stats['p50_latency_ms'], stats['p95_latency_ms'] = self._percentiles(
+                f"SELECT latency_ms FROM log_events WHERE client_id = ? AND ts >= ? AND ts < ? "
+                f"AND kind IN {RESULT_KINDS} AND latency_ms IS NOT NULL", (client, start, end)
+            )
+            # Copy lag: first master alert for the order to the child's order being created
+            stats['p50_copy_lag_ms'], stats['p95_copy_lag_ms'] = self._percentiles(
+                """SELECT (c.ts - MIN(a.ts)) * 1000 FROM log_events c
+                   JOIN log_events a ON a.order_id = c.order_id AND a.kind = 'alert'
+                   WHERE c.client_id = ? AND c.ts >= ? AND c.ts < ? AND c.kind = 'created'
+                   GROUP BY c.signature, c.offset""", (client, start, end)
+            )
+            stats['errors'] = {r['error_class']: r['count'] for r in self._conn.execute(
+                """SELECT error_class, COUNT(*) AS count FROM log_events
+                   WHERE client_id = ? AND ts >= ? AND ts < ? AND kind = 'error'
+                   GROUP BY error_class ORDER BY count DESC""", (client, start, end)
+            )}
+            children[client] = stats
+        return children
+
+    def errors(self, day=None):
+        """Error classes across the engine with counts and first/last occurrence"""
+        start, end = self._period(day)
+        return [dict(row) for row in self._conn.execute(
+            """SELECT error_class, COUNT(*) AS count, COUNT(DISTINCT client_id) AS accounts,
+                      MIN(ts) AS first_seen, MAX(ts) AS last_seen, MAX(message) AS example
+               FROM log_events WHERE kind = 'error' AND ts >= ? AND ts < ?
+               GROUP BY error_class ORDER BY count DESC""", (start, end)
+        )]
+
+    def timeline(self, order_id):
+        """Every indexed line about a master order and its child orders, in time order"""
+        return [dict(row) for row in self._conn.execute(
+            """SELECT ts, pid, level, kind, order_id, client_id, child_order_id, latency_ms, message
+               FROM log_events
+               WHERE order_id = ? OR child_order_id IN (
+                   SELECT child_order_id FROM log_events WHERE order_id = ? AND child_order_id IS NOT NULL)
+               ORDER BY ts, offset""", (str(order_id), str(order_id))
+        )]
+
+    def close(self):
+        self._conn.close()
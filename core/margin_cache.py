@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_funds(data):
+    """Normalise a Dhan fund limit response body"""
+    return {
+        # Dhan spells the field 'availabelBalance'
+        'available': float(data.get('availabelBalance', data.get('availableBalance', 0)) or 0),
+        'used': float(data.get('utilizedAmount', 0) or 0),
+        'sod_limit': float(data.get('sodLimit', 0) or 0),
+        'withdrawable': float(data.get('withdrawableBalance', 0) or 0)
+    }
+
+
+class MarginCache:
+    """Latest fund limits per account, refreshed in the background
+
+    Sizing reads from here instead of calling the broker for every order;
+    ``age`` tells how stale a snapshot is.
+    """
+
+    def __init__(self, refresh_interval=30):
+        self.refresh_interval = refresh_interval
+        self._funds = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def update(self, client_id, data):
+        """Store a fund limit response body for an account"""
+        funds = dict(parse_funds(data), fetched_at=time.time())
+        with self._lock:
+            self._funds[str(client_id)] = funds
+
+    def get(self, client_id):
+        """Latest snapshot for an account, or None if never fetched"""
+        with self._lock:
+            return self._funds.get(str(client_id))
+
+    def available(self, client_id):
+        """Cached available balance, or None if unknown"""
+        funds = self.get(client_id)
+        return funds['available'] if funds else None
+
+    def age(self, client_id):
+        funds = self.get(client_id)
+        return time.time() - funds['fetched_at'] if funds else None
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._funds)
+
+    def refresh(self, accounts):
+        """Fetch fund limits for ``{client_id: dhan}`` concurrently"""
+        if not accounts:
+            return
+
+        def fetch(item):
+            client_id, dhan = item
+            try:
+                response = dhan.get_fund_limits()
+                if response.get('status') == 'success':
+                    self.update(client_id, response['data'])
+                else:
+                    logging.error(f"Failed to fetch margins for {client_id}: {response.get('remarks')}")
+            except Exception as e:
+                logging.error(f"Error fetching margins for {client_id}: {e}")
+
+        with ThreadPoolExecutor(max_workers=min(len(accounts), 16), thread_name_prefix='margin-refresh') as executor:
+            list(executor.map(fetch, accounts.items()))
+
+    def start(self, accounts_fn):
+        """Refresh in a background thread every ``refresh_interval`` seconds
+
+        ``accounts_fn`` returns the current ``{client_id: dhan}`` to refresh.
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.refresh_interval)
+                self.refresh(accounts_fn())
+
+        self._thread = threading.Thread(target=loop, name='margin-refresh')
+        self._thread.daemon = True
+        self._thread.start()
@@ -0,0 +1,58 @@
+import csv
+import os
+
+
+def slice_quantity(quantity, freeze_qty=None, lot_size=1):
+    """Split a quantity into legs that each stay below the exchange freeze quantity
+
+    Every leg but the last is the largest whole number of lots under
+    ``freeze_qty``; the last leg takes the remainder.
+    """
+    quantity = int(quantity)
+    if not freeze_qty or quantity < freeze_qty:
+        return [quantity]
+
+    lot_size = max(int(lot_size or 1), 1)
+    max_leg = ((int(freeze_qty) - 1) // lot_size) * lot_size
+    if max_leg <= 0:
+        raise Exception(f"Freeze quantity {freeze_qty} is smaller than one lot of {lot_size}")
+
+    full_legs, rest = divmod(quantity, max_leg)
+    return [max_leg] * full_legs + ([rest] if rest else [])
+
+
+class FreezeTable:
+    """Per-instrument freeze quantity and lot size, keyed by security_id"""
+
+    def __init__(self, limits=None):
+        self.limits = {}
+        for security_id, entry in (limits or {}).items():
+            self.limits[str(security_id)] = (
+                int(entry['freeze_qty']) if entry.get('freeze_qty') else None,
+                int(entry.get('lot_size') or 1)
+            )
+
+    @classmethod
+    def load(cls, source):
+        """Build the table from a config dict or a CSV file path"""
+        if not source:
+            return cls()
+        if isinstance(source, dict):
+            return cls(source)
+        if not os.path.exists(source):
+            raise Exception(f"Freeze limit file {source} not found")
+        with open(source, 'r', newline='') as f:
+            return cls({row['security_id']: row for row in csv.DictReader(f)})
+
+    def get(self, security_id):
+        """Return (freeze_qty, lot_size) for an instrument; freeze_qty is None if unknown"""
+        return self.limits.get(str(security_id), (None, 1))
+
+    def slice(self, security_id, quantity, lot_size=None):
+        """Split a child quantity into compliant legs for this instrument
+
+        ``lot_size`` overrides the table's lot size, e.g. with the one from
+        the instrument master.
+        """
+        freeze_qty, table_lot_size = self.get(security_id)
+        return slice_quantity(quantity, freeze_qty, lot_size or table_lot_size)
@@ -0,0 +1,169 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+DEFAULT_PROFILE_DIR = 'profiles'
+PROFILE_MODES = ('sample', 'cprofile')
+MAX_PROFILE_SECONDS = 600
+
+# Dump files the app is allowed to serve
+DUMP_NAME = re.compile(r'^(sample|cprofile)-\d{8}-\d{6}\.(collapsed|pstats|txt)$')
+
+# From 3.12 cProfile hooks every thread through sys.monitoring and only one
+# profiler may be active, so a single profile is enabled for the window
+# instead of one per calling thread
+GLOBAL_PROFILE = sys.version_info >= (3, 12)
+
+
+def parse_profile_spec(spec):
+    """Parse 'mode[:seconds]' as given in COPYTRADE_PROFILE, e.g. 'sample:30'"""
+    mode, _, seconds = (spec or '').strip().partition(':')
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Profile mode must be one of {', '.join(PROFILE_MODES)}")
+    seconds = float(seconds or 30)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"Profile window must be between 0 and {MAX_PROFILE_SECONDS} seconds")
+    return mode, seconds
+
+
+class Profiler:
+    """Bounded, opt-in profiling windows for the copy path
+
+    ``sample`` mode polls every thread's stack from a background thread and
+    writes collapsed stacks (flamegraph.pl / speedscope input); nothing runs
+    on the copy path itself. ``cprofile`` mode runs the calls passed through
+    ``call`` under cProfile and writes pstats plus a text summary. Outside a
+    window ``call`` is a plain function call.
+    """
+
+    def __init__(self, out_dir=DEFAULT_PROFILE_DIR, interval_ms=5, max_depth=64):
+        self.out_dir = out_dir
+        self.interval = interval_ms / 1000
+        self.max_depth = max_depth
+        self.mode = None
+        self._until = 0
+        self._profiles = {}
+        self._inflight = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def active(self):
+        return self.mode is not None
+
+    def start(self, mode, seconds):
+        """Open a profiling window; return False if one is already running"""
+        with self._lock:
+            if self.mode is not None:
+                return False
+            self.mode = mode
+            self._until = time.monotonic() + seconds
+            self._profiles = {}
+        if mode == 'cprofile' and GLOBAL_PROFILE:
+            self._profiles[None] = cProfile.Profile()
+            self._profiles[None].enable()
+        target = self._sample if mode == 'sample' else self._wait
+        thread = threading.Thread(target=target, name=f"profiler-{mode}")
+        thread.daemon = True
+        thread.start()
+        logging.info(f"Profiling ({mode}) for {seconds:g} s")
+        return True
+
+    def call(self, fn, *args, **kwargs):
+        """Run ``fn``, under cProfile when a cprofile window is open"""
+        if self.mode != 'cprofile' or GLOBAL_PROFILE or getattr(self._local, 'inside', False):
+            return fn(*args, **kwargs)
+        with self._lock:
+            profile = None
+            if self.mode == 'cprofile':
+                profile = self._profiles.setdefault(threading.get_ident(), cProfile.Profile())
+                self._inflight += 1
+        if profile is None:
+            return fn(*args, **kwargs)
+        self._local.inside = True
+        try:
+            return profile.runcall(fn, *args, **kwargs)
+        finally:
+            self._local.inside = False
+            with self._lock:
+                self._inflight -= 1
+
+    def _dump_path(self, mode, suffix):
+        os.makedirs(self.out_dir, exist_ok=True)
+        return os.path.join(self.out_dir, f"{mode}-{time.strftime('%Y%m%d-%H%M%S')}.{suffix}")
+
+    def _sample(self):
+        """Collect collapsed stacks of every other thread until the window closes"""
+        stacks = Counter()
+        me = threading.get_ident()
+        samples = 0
+        while time.monotonic() < self._until:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None and len(frames) < self.max_depth:
+                    code = frame.f_code
+                    frames.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stacks[';'.join(reversed(frames))] += 1
+            samples += 1
+            time.sleep(self.interval)
+
+        path = self._dump_path('sample', 'collapsed')
+        with open(path, 'w') as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.mode = None
+        logging.info(f"Profiling finished: {samples} samples written to {path}")
+
+    def _wait(self):
+        """Close the cprofile window when it runs out and write the stats"""
+        time.sleep(max(self._until - time.monotonic(), 0))
+        with self._lock:
+            profiles = list(self._profiles.values())
+            self._profiles = {}
+            # New calls run unprofiled from here; let the ones in flight finish
+            self.mode = None
+        while self._inflight:
+            time.sleep(0.01)
+        if GLOBAL_PROFILE:
+            profiles[0].disable()
+
+        stats = None
+        for profile in profiles:
+            if not profile.getstats():
+                continue
+            if stats is None:
+                stats = pstats.Stats(profile)
+            else:
+                stats.add(profile)
+        if stats is None:
+            logging.info('Profiling finished: no profiled calls in the cProfile window')
+            return
+        path = self._dump_path('cprofile', 'pstats')
+        stats.dump_stats(path)
+        summary = io.StringIO()
+        stats.stream = summary
+        stats.sort_stats('cumulative').print_stats(60)
+        with open(path[:-len('pstats')] + 'txt', 'w') as f:
+            f.write(summary.getvalue())
+        logging.info(f"Profiling finished: cProfile stats written to {path}")
+
+
+def list_dumps(out_dir=DEFAULT_PROFILE_DIR):
+    """Profile dumps in ``out_dir``, newest first"""
+    if not os.path.isdir(out_dir):
+        return []
+    dumps = [{'name': name, 'size': os.path.getsize(os.path.join(out_dir, name)),
+              'created': os.path.getmtime(os.path.join(out_dir, name))}
+             for name in os.listdir(out_dir) if DUMP_NAME.match(name)]
+    return sorted(dumps, key=lambda dump: dump['created'], reverse=True)
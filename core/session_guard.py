@@ -0,0 +1,127 @@
+import base64
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+
+def token_expiry(access_token):
+    """Expiry (epoch seconds) from the ``exp`` claim of a Dhan JWT access token, or None
+
+    The signature is not verified; this only reads the claim to warn early.
+    """
+    try:
+        payload = access_token.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (AttributeError, IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def at_time(clock, day=None):
+    """Epoch seconds of an HH:MM local time on ``day`` (default today)"""
+    day = day or datetime.now()
+    hour, minute = (int(part) for part in clock.split(':'))
+    return day.replace(hour=hour, minute=minute, second=0, microsecond=0).timestamp()
+
+
+class SessionGuard:
+    """Pre-open token checks and connection warm-up for every account
+
+    A few minutes before market open each trading day, every account's
+    token expiry is checked and one cheap authenticated call is made on its
+    connection, all in parallel. That surfaces expired or revoked tokens
+    before the first copied order, and leaves a warm, pooled connection per
+    account so the first order does not pay for DNS and TLS.
+    """
+
+    def __init__(self, market_open='09:15', market_close='15:30', warmup_minutes=10,
+                 trading_days=(0, 1, 2, 3, 4), on_funds=None, on_report=None):
+        self.market_open = market_open
+        self.market_close = market_close
+        self.warmup_minutes = warmup_minutes
+        self.trading_days = trading_days
+        self.on_funds = on_funds
+        self.on_report = on_report
+        self.last_report = {}
+        self._thread = None
+
+    def check(self, accounts):
+        """Validate and warm ``{client_id: (dhan, token_expiry)}`` concurrently
+
+        Returns ``{client_id: result}``; ``ok`` is False for accounts whose
+        token has expired, expires before market close or was rejected.
+        """
+        if not accounts:
+            return {}
+        close = at_time(self.market_close)
+
+        def probe(item):
+            client_id, (dhan, expires_at) = item
+            result = {'ok': True, 'expires_at': expires_at, 'latency_ms': None, 'error': None}
+            now = time.time()
+            if expires_at is not None and expires_at <= now:
+                result.update(ok=False, error=f"token expired at {datetime.fromtimestamp(expires_at):%Y-%m-%d %H:%M}")
+                return client_id, result
+            started = time.perf_counter()
+            try:
+                response = dhan.get_fund_limits()
+            except Exception as e:
+                response = {'status': 'failure', 'remarks': str(e)}
+            result['latency_ms'] = (time.perf_counter() - started) * 1000
+            if response.get('status') != 'success':
+                result.update(ok=False, error=f"broker rejected the session: {response.get('remarks')}")
+            elif self.on_funds is not None:
+                self.on_funds(client_id, response['data'])
+            if result['ok'] and expires_at is not None and now < close and expires_at < close:
+                result.update(ok=False, error=f"token expires at {datetime.fromtimestamp(expires_at):%H:%M}, "
+                                              f"before market close")
+            return client_id, result
+
+        with ThreadPoolExecutor(max_workers=min(len(accounts), 64), thread_name_prefix='session-check') as executor:
+            report = dict(executor.map(probe, accounts.items()))
+
+        for client_id, result in report.items():
+            if result['ok']:
+                logging.info(f"Session {client_id} ready in {result['latency_ms']:.0f} ms")
+            else:
+                logging.error(f"Session {client_id} will fail: {result['error']}")
+        self.last_report = report
+        if self.on_report is not None:
+            self.on_report(report)
+        return report
+
+    def next_warmup(self, now=None):
+        """Epoch seconds of the next pre-open warm-up"""
+        now = datetime.fromtimestamp(now or time.time())
+        day = now
+        while True:
+            warmup = at_time(self.market_open, day) - self.warmup_minutes * 60
+            if day.weekday() in self.trading_days and warmup > now.timestamp():
+                return warmup
+            day = (day + timedelta(days=1)).replace(hour=0, minute=0)
+
+    def start(self, accounts_fn):
+        """Run ``check`` before every market open in a background thread
+
+        ``accounts_fn`` returns the current ``{client_id: (dhan, token_expiry)}``.
+        """
+        if self._thread is not None:
+            return
+
+        def loop():
+            while True:
+                warmup = self.next_warmup()
+                logging.info(f"Next session warm-up at {datetime.fromtimestamp(warmup):%Y-%m-%d %H:%M}")
+                time.sleep(max(warmup - time.time(), 0))
+                try:
+                    self.check(accounts_fn())
+                except Exception as e:
+                    logging.error(f"Session warm-up failed: {e}")
+                time.sleep(1)
+
+        self._thread = threading.Thread(target=loop, name='session-guard')
+        self._thread.daemon = True
+        self._thread.start()
@@ -0,0 +1,146 @@
+"""Micro-benchmarks for the copy engine
+
+    python dhan_benchmark.py broker --children 50 --latency 0.05
+    python dhan_benchmark.py translate --children 1 10 100 1000
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dhan_broker_stub import start_stub
+
+ORDER = {
+    'security_id': '1333',
+    'exchange_segment': 'NSE_EQ',
+    'transaction_type': 'BUY',
+    'quantity': 1,
+    'order_type': 'LIMIT',
+    'product_type': 'INTRADAY',
+    'price': 100.0,
+    'trigger_price': 0,
+    'validity': 'DAY'
+}
+
+
+def summarize(label, timings):
+    """Print wall-clock statistics for one benchmark path"""
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{label:10} mean {statistics.mean(timings):8.1f} ms  p50 {statistics.median(timings):8.1f} ms  "
+          f"p95 {p95:8.1f} ms  threads {threading.active_count()}")
+
+
+def bench_broker(args):
+    """Fan one order out to every child via the threaded and async backends"""
+    from dhanhq import dhanhq
+    from core.async_broker import AsyncBroker
+
+    server, url = start_stub(latency=args.latency)
+    print(f"{args.children} children, {args.rounds} rounds, {args.latency * 1000:.0f} ms broker latency")
+
+    clients = []
+    for i in range(args.children):
+        client = dhanhq(client_id=f"C{i}", access_token='stub')
+        client.base_url = url
+        clients.append(client)
+
+    if args.serial:
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            for client in clients:
+                client.place_order(**ORDER)
+            timings.append((time.perf_counter() - started) * 1000)
+        summarize('serial', timings)
+
+    with ThreadPoolExecutor(max_workers=args.children) as executor:
+        timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            list(executor.map(lambda client: client.place_order(**ORDER), clients))
+            timings.append((time.perf_counter() - started) * 1000)
+        summarize('threaded', timings)
+
+    broker = AsyncBroker(base_url=url, pool_size=args.children)
+    broker.start()
+    aio_clients = [broker.client(f"C{i}", 'stub').aio for i in range(args.children)]
+    timings = []
+    for _ in range(args.rounds):
+        started = time.perf_counter()
+        broker.gather_timed([(aio, 'place_order', ORDER) for aio in aio_clients])
+        timings.append((time.perf_counter() - started) * 1000)
+    summarize('async', timings)
+    broker.stop()
+    server.shutdown()
+
+
+MASTER_ORDER = {
+    'order_id': '1',
+    'order_status': 'OPEN',
+    'exchange': 'NFO',
+    'transaction_type': 'BUY',
+    'product': 'NRML',
+    'order_type': 'LIMIT',
+    'validity': 'DAY',
+    'quantity': 750,
+    'price': 100.5,
+    'trigger_price': 0,
+    'security_id': '35001'
+}
+
+
+def bench_translate(args):
+    """Time translating one master event for growing numbers of children
+
+    ``translate`` is the once-per-event plan lookup, ``scale`` the batch lot
+    rounding and ``stamp`` the per-child copy of the plan with its quantity.
+    """
+    import Dhan_CopyTrader as engine
+    from core.instruments import round_to_lots
+
+    for children in args.children:
+        multipliers = [1 + i % 3 for i in range(children)]
+        translate_timings = []
+        scale_timings = []
+        stamp_timings = []
+        for _ in range(args.rounds):
+            started = time.perf_counter()
+            kwargs = engine.buildPlaceOrder(MASTER_ORDER)
+            lot_size = engine.lotSize(kwargs)
+            translated = time.perf_counter()
+            quantities = round_to_lots([MASTER_ORDER['quantity'] * m for m in multipliers], lot_size)
+            scaled = time.perf_counter()
+            for quantity in quantities:
+                dict(kwargs, quantity=quantity)
+            stamp_timings.append((time.perf_counter() - scaled) * 1e6)
+            scale_timings.append((scaled - translated) * 1e6)
+            translate_timings.append((translated - started) * 1e6)
+        print(f"{children:5} children  translate {statistics.median(translate_timings):6.2f} us  "
+              f"scale {statistics.median(scale_timings) / children:5.2f} us/child  "
+              f"stamp {statistics.median(stamp_timings) / children:5.2f} us/child")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy engine micro-benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    broker = commands.add_parser('broker', help='compare broker backends against the local stand-in')
+    broker.add_argument('--children', type=int, default=50)
+    broker.add_argument('--rounds', type=int, default=10)
+    broker.add_argument('--latency', type=float, default=0.05, help='stand-in latency in seconds')
+    broker.add_argument('--serial', action='store_true', help='also time the one-child-at-a-time loop')
+    broker.set_defaults(run=bench_broker)
+
+    translate = commands.add_parser('translate', help='time master order translation against child count')
+    translate.add_argument('--children', type=int, nargs='+', default=[1, 10, 100, 1000])
+    translate.add_argument('--rounds', type=int, default=1000)
+    translate.set_defaults(run=bench_translate)
+
+    args = parser.parse_args()
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
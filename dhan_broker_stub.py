@@ -0,0 +1,123 @@
+"""Local stand-in for the Dhan order API, for benchmarks and shadow runs
+
+Serves the endpoints the copy engine uses (orders, fund limits, positions)
+with a configurable artificial latency, so broker backends can be compared
+without touching a real account. Placed orders are kept per client so the
+order book and correlation id lookups reflect what was sent.
+
+    python dhan_broker_stub.py --port 8765 --latency 0.05
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class BrokerStubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Accept a burst of new connections from a whole fan-out at once
+    request_queue_size = 256
+
+
+class BrokerStubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    order_ids = itertools.count(1000000)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return json.loads(self.rfile.read(length)) if length else {}
+
+    def _delay(self):
+        time.sleep(self.server.latency)
+
+    def _book(self):
+        # dhanhq only identifies the account by its token
+        return self.server.orders.setdefault(self.headers.get('access-token'), {})
+
+    def do_GET(self):
+        self._delay()
+        if self.path.endswith('/fundlimit'):
+            self._reply({'availabelBalance': 500000.0, 'sodLimit': 500000.0,
+                         'utilizedAmount': 0.0, 'withdrawableBalance': 500000.0})
+        elif self.path.endswith('/orders'):
+            with self.server.lock:
+                self._reply(list(self._book().values()))
+        elif '/orders/external/' in self.path:
+            correlation_id = self.path.rsplit('/', 1)[-1]
+            with self.server.lock:
+                matches = [order for order in self._book().values() if order['correlationId'] == correlation_id]
+            if matches:
+                self._reply(matches[-1])
+            else:
+                self._reply({'errorCode': 'DH-906', 'errorMessage': 'Order not found'}, 400)
+        elif self.path.endswith('/positions') or self.path.endswith('/trades'):
+            self._reply([])
+        else:
+            self._reply({'errorCode': 'DH-404', 'errorMessage': 'Not found'}, 404)
+
+    def do_POST(self):
+        payload = self._read_body()
+        self._delay()
+        if self.path.endswith('/orders'):
+            order = {'orderId': str(next(self.order_ids)), 'orderStatus': 'PENDING',
+                     'correlationId': payload.get('correlationId'), 'quantity': payload.get('quantity'),
+                     'price': payload.get('price'), 'triggerPrice': payload.get('triggerPrice')}
+            with self.server.lock:
+                self._book()[order['orderId']] = order
+            self._reply(dict(order, orderStatus='TRANSIT'))
+        else:
+            self._reply({'errorCode': 'DH-404', 'errorMessage': 'Not found'}, 404)
+
+    def do_PUT(self):
+        self._read_body()
+        self._delay()
+        self._reply({'orderId': self.path.rsplit('/', 1)[-1], 'orderStatus': 'TRANSIT'})
+
+    def do_DELETE(self):
+        self._delay()
+        with self.server.lock:
+            order = self._book().get(self.path.rsplit('/', 1)[-1])
+            if order is not None:
+                order['orderStatus'] = 'CANCELLED'
+        self._reply({'orderId': self.path.rsplit('/', 1)[-1], 'orderStatus': 'CANCELLED'})
+
+
+def start_stub(port=0, latency=0.05):
+    """Start the stand-in on a background thread and return (server, base_url)"""
+    server = BrokerStubServer(('127.0.0.1', port), BrokerStubHandler)
+    server.latency = latency
+    server.orders = {}
+    server.lock = threading.Lock()
+    thread = threading.Thread(target=server.serve_forever, name='broker-stub')
+    thread.daemon = True
+    thread.start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v2"
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the Dhan order API')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every reply')
+    args = parser.parse_args()
+
+    server, url = start_stub(args.port, args.latency)
+    print(f"Broker stand-in listening on {url} (latency {args.latency * 1000:.0f} ms)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
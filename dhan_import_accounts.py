@@ -0,0 +1,56 @@
+"""Bulk import of child accounts from a CSV file
+
+    python dhan_import_accounts.py followers.csv
+    python dhan_import_accounts.py followers.csv --config config.json --replace --no-validate
+
+The CSV needs name, client_id and access_token columns; multiplier,
+enabled, sizing, fixed_quantity and max_notional are optional. Tokens are
+stored encrypted with the key in .env and the config is written once.
+"""
+import argparse
+import json
+import sys
+import time
+
+from core.account_import import connect_account, import_accounts, read_accounts_csv
+from core.common import count_statuses, write_config_atomic
+from core.encryption import EncryptionManager
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import child accounts from a CSV file')
+    parser.add_argument('csv', help='accounts CSV')
+    parser.add_argument('--config', default='config.json', help='configuration file to update')
+    parser.add_argument('--replace', action='store_true', help='overwrite accounts whose name already exists')
+    parser.add_argument('--no-validate', action='store_true', help='add accounts without testing their connection')
+    parser.add_argument('--json', action='store_true', help='print the per-row report as JSON')
+    args = parser.parse_args()
+
+    with open(args.config, 'r') as f:
+        config = json.load(f)
+    with open(args.csv, 'r', newline='', encoding='utf-8-sig') as f:
+        rows = read_accounts_csv(f)
+
+    started = time.perf_counter()
+    results, _ = import_accounts(config, rows, EncryptionManager(),
+                                 connect=None if args.no_validate else connect_account,
+                                 replace=args.replace)
+    if any(result['status'] in ('added', 'updated') for result in results):
+        write_config_atomic(args.config, config)
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            latency = f"{result['latency_ms']:.0f} ms" if result.get('latency_ms') is not None else ''
+            print(f"line {result['line']:>4}  {result['name']:20} {result['client_id']:12} "
+                  f"{result['status']:8} {latency:>8}  {result['error'] or ''}")
+    counts = count_statuses(results)
+    print(f"{len(results)} rows in {elapsed:.1f} s: "
+          + ', '.join(f"{count} {status}" for status, count in counts.items()), file=sys.stderr)
+    return 1 if counts.get('failed') else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Post-mortem queries over logcopytrade.log and its rotated segments
+
+    python dhan_log_analyzer.py summary --day 2026-10-19
+    python dhan_log_analyzer.py timeline 52210192837
+    python dhan_log_analyzer.py errors --day 2026-10-19
+
+Each command first indexes whatever was logged since the last run.
+"""
+import argparse
+import json
+from datetime import datetime
+
+from core.log_analyzer import LogAnalyzer, DEFAULT_LOG_PATH
+
+
+def fmt(value, digits=1):
+    return '-' if value is None else f"{value:.{digits}f}"
+
+
+def show_summary(analyzer, args):
+    """Print per-child results, latency and failures"""
+    summary = analyzer.summary(args.day, args.client)
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{'Child':14} {'created':>8} {'updated':>8} {'cancel':>7} {'failed':>7} "
+          f"{'lat p50':>8} {'lat p95':>8} {'lat max':>8} {'lag p50':>8} {'lag p95':>8}")
+    for client_id, stats in summary.items():
+        print(f"{client_id:14} {stats['created']:8} {stats['updated']:8} {stats['cancelled']:7} "
+              f"{stats['failures']:7} {fmt(stats['p50_latency_ms']):>8} {fmt(stats['p95_latency_ms']):>8} "
+              f"{fmt(stats['max_latency_ms']):>8} {fmt(stats['p50_copy_lag_ms']):>8} "
+              f"{fmt(stats['p95_copy_lag_ms']):>8}")
+        for error_class, count in stats['errors'].items():
+            print(f"{'':14} {count:>5} x {error_class}")
+
+
+def show_timeline(analyzer, args):
+    """Print every line about one master order and its child orders"""
+    events = analyzer.timeline(args.order_id)
+    if args.json:
+        print(json.dumps(events, indent=2))
+        return
+    for event in events:
+        when = datetime.fromtimestamp(event['ts']).strftime('%H:%M:%S.%f')[:-3]
+        print(f"{when} {event['level']:7} {event['kind']:10} {event['client_id'] or '':12} "
+              f"{event['message'].splitlines()[0]}")
+
+
+def show_errors(analyzer, args):
+    """Print error classes, most frequent first"""
+    errors = analyzer.errors(args.day)
+    if args.json:
+        print(json.dumps(errors, indent=2))
+        return
+    for error in errors:
+        last_seen = datetime.fromtimestamp(error['last_seen']).strftime('%Y-%m-%d %H:%M:%S')
+        print(f"{error['count']:6} x  {error['accounts']} accounts  last {last_seen}  {error['error_class']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy trader log analysis')
+    parser.add_argument('--log', default=DEFAULT_LOG_PATH, help='live log file; rotated segments are found next to it')
+    parser.add_argument('--index', help='index database (default: <log>.index.db)')
+    parser.add_argument('--json', action='store_true', help='print JSON instead of a table')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    index = commands.add_parser('index', help='only bring the index up to date')
+    index.set_defaults(run=None)
+
+    summary = commands.add_parser('summary', help='per-child latency and failure summary')
+    summary.add_argument('--day', help='YYYY-MM-DD, local time')
+    summary.add_argument('--client', help='only this child client id')
+    summary.set_defaults(run=show_summary)
+
+    timeline = commands.add_parser('timeline', help='everything logged about one master order')
+    timeline.add_argument('order_id')
+    timeline.set_defaults(run=show_timeline)
+
+    errors = commands.add_parser('errors', help='error classes with counts')
+    errors.add_argument('--day', help='YYYY-MM-DD, local time')
+    errors.set_defaults(run=show_errors)
+
+    args = parser.parse_args()
+    analyzer = LogAnalyzer(args.log, args.index)
+    try:
+        added = analyzer.update()
+        if args.run is None:
+            print(f"Indexed {added} new log events")
+        else:
+            args.run(analyzer, args)
+    finally:
+        analyzer.close()
+
+
+if __name__ == '__main__':
+    main()
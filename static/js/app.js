@@ -168,6 +168,18 @@ async function apiRequest(url, method = 'GET', data = null) {
     }
 }
 
+// Security: HTML escape helper to prevent XSS when building markup
+function escapeHtml(text) {
+    const map = {
+        '&': '&amp;',
+        '<': '&lt;',
+        '>': '&gt;',
+        '"': '&quot;',
+        "'": '&#039;'
+    };
+    return String(text ?? '').replace(/[&<>"']/g, function(m) { return map[m]; });
+}
+
 // Format currency helper
 function formatCurrency(amount, currency = '₹') {
     if (typeof amount !== 'number') {